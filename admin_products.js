@@ -1,4 +1,4 @@
-const API_BASE = 'http://localhost:8000';
+const API_BASE = '';
 
 // Ensure token exists
 const token = localStorage.getItem('access_token');
@@ -11,9 +11,18 @@ if (!token) {
 // Fetch and display all products for admin
 async function loadAdminProducts() {
   try {
-    const res = await fetch(`${API_BASE}/product/`);
-    if (!res.ok) throw new Error('Failed to fetch products');
-    const data = await res.json();
+    // the listing is paginated; admins need every page
+    const products = [];
+    let cursor = null;
+    do {
+      const params = new URLSearchParams({ limit: 100 });
+      if (cursor) params.set('cursor', cursor);
+      const res = await fetch(`${API_BASE}/product/?${params}`);
+      if (!res.ok) throw new Error('Failed to fetch products');
+      const page = await res.json();
+      products.push(...page.data);
+      cursor = page.next_cursor;
+    } while (cursor);
 
     const adminTable = document.getElementById('admin-products-table');
     adminTable.innerHTML = `
@@ -28,7 +37,7 @@ async function loadAdminProducts() {
       </tr>
     `;
 
-    data.data.forEach(product => {
+    products.forEach(product => {
       const row = document.createElement('tr');
       row.innerHTML = `
         <td>${product.id}</td>
@@ -0,0 +1,177 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import carts
+import catalog
+import etags
+import ratelimit
+import rollups
+from cache import product_cache, row_to_dict
+from database import get_async_db
+from database_models import Cart, Product, Transaction, User
+from models import CartCreate, CartViewResponse, CartWriteResponse, ProductDetailResponse, ProductPageResponse, TransactionCreate, TransactionResponse
+
+
+# asyncio-native versions of the hot routes in main.py. They run on the event
+# loop instead of Starlette's threadpool, so concurrency is bounded by the
+# database pool rather than by the number of worker threads.
+router = APIRouter(prefix="/async", tags=["async"])
+
+
+@router.get("/product/", response_model=ProductPageResponse, status_code=status.HTTP_200_OK)
+async def get_all_products(
+    request: Request,
+    response: Response,
+    category_id: Optional[List[int]] = Query(None),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    color: Optional[str] = None,
+    size: Optional[str] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    not_modified = await etags.acheck_not_modified(request, response, db, "product", request.url.query)
+    if not_modified:
+        return not_modified
+
+    products, next_cursor = await catalog.alist_products(
+        db,
+        category_ids=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        color=color,
+        size=size,
+        sort=sort,
+        cursor=cursor,
+        limit=limit,
+    )
+    return {
+        "status": "success",
+        "count": len(products),
+        "next_cursor": next_cursor,
+        "data": products
+    }
+
+
+@router.get("/product/{product_id}", response_model=ProductDetailResponse, status_code=status.HTTP_200_OK)
+async def get_product_by_id(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        product = await db.get(Product, product_id)
+        return row_to_dict(product) if product else None
+
+    product = await product_cache.aget_or_load(product_id, load)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    return {
+        "status": "success",
+        "data": product
+    }
+
+
+@router.post("/cart/", response_model=CartWriteResponse, status_code=status.HTTP_201_CREATED)
+async def add_to_cart(cart_item: CartCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
+    ratelimit.enforce(request, "cart", user=cart_item.buyer_id)
+    user = await db.get(User, cart_item.buyer_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    product = await db.get(Product, cart_item.product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    if cart_item.quantity > product.quantity:
+        raise HTTPException(status_code=400, detail="Requested quantity exceeds available stock")
+
+    line = select(Cart).where(Cart.buyer_id == cart_item.buyer_id, Cart.product_id == cart_item.product_id)
+    existing_item = (await db.execute(line)).scalars().first()
+
+    if not existing_item:
+        new_cart = Cart(
+            buyer_id=cart_item.buyer_id,
+            product_id=cart_item.product_id,
+            quantity=cart_item.quantity
+        )
+        db.add(new_cart)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # uq_cart_buyer_id_product_id: a concurrent first add of this product won, so add onto its line
+            await db.rollback()
+            existing_item = (await db.execute(line)).scalars().first()
+            if not existing_item:
+                raise
+        else:
+            return {
+                "status": "success",
+                "message": "Product added to cart successfully",
+                "data": {
+                    "id": new_cart.id,
+                    "buyer_id": new_cart.buyer_id,
+                    "product_id": new_cart.product_id,
+                    "quantity": new_cart.quantity
+                }
+            }
+
+    existing_item.quantity += cart_item.quantity
+    await db.commit()
+    return {
+        "status": "success",
+        "message": "Cart updated successfully (quantity increased)",
+        "data": {
+            "id": existing_item.id,
+            "buyer_id": existing_item.buyer_id,
+            "product_id": existing_item.product_id,
+            "quantity": existing_item.quantity
+        }
+    }
+
+
+@router.get("/cart/{buyer_id}", response_model=CartViewResponse, status_code=status.HTTP_200_OK)
+async def get_user_cart(buyer_id: int, db: AsyncSession = Depends(get_async_db)):
+    rows = (await db.execute(carts.cart_view_statement(buyer_id))).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Cart is empty")
+
+    return carts.build_cart_view(rows)
+
+
+@router.post("/transaction/", response_model=TransactionResponse)
+async def create_transaction(transaction: TransactionCreate, db: AsyncSession = Depends(get_async_db)):
+    buyer = await db.get(User, transaction.buyer_id)
+    if not buyer:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Buyer not found."
+        )
+
+    new_transaction = Transaction(
+        buyer_id=transaction.buyer_id,
+        amount=transaction.amount,
+        status=transaction.status
+    )
+
+    db.add(new_transaction)
+    await db.run_sync(rollups.record_order)
+    await db.commit()
+
+    return new_transaction
+
+
+@router.get("/transaction/{transaction_id}", response_model=TransactionResponse)
+async def get_transaction(transaction_id: int, db: AsyncSession = Depends(get_async_db)):
+    transaction = await db.get(Transaction, transaction_id)
+    if not transaction:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Transaction with ID {transaction_id} not found."
+        )
+    return transaction
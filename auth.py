@@ -1,9 +1,15 @@
+import asyncio
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import bcrypt
 from jose import jwt, JWTError
 from pydantic import BaseModel
 from fastapi import Depends, HTTPException, APIRouter, status
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from starlette import status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordBearer
@@ -11,6 +17,7 @@ import database_models
 from database import session
 from database import get_db
 from database_models import User
+from cache import principal_cache, row_to_dict
 from sqlalchemy import Boolean
 
 
@@ -21,16 +28,65 @@ SECRET_KEY = '16a45ed832ffccbd35cfd9ca4c85e006'
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-bcrypt_context = CryptContext(schemes =['bcrypt'], deprecated = 'auto')
+# bcrypt cost factor; raising it makes existing hashes get upgraded on next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# hashing runs on its own small pool so login bursts queue here instead of
+# occupying the threads that serve every other request
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", "64"))
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
 
 credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials", headers = {"WWW-Authenticate": "Bearer"})
 
 
+def _secret(plain_password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes; bcrypt>=5 refuses longer input
+    return plain_password.encode("utf-8")[:72]
+
+def is_password_hash(value: str) -> bool:
+    return value.startswith(("$2a$", "$2b$", "$2y$"))
+
 def get_password_hash(plain_password: str) -> str:
-    return bcrypt_context.hash(plain_password)
+    return bcrypt.hashpw(_secret(plain_password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt_context.verify(plain_password, hashed_password)
+    if not is_password_hash(hashed_password):
+        # accounts created before passwords were hashed
+        return hmac.compare_digest(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    return bcrypt.checkpw(_secret(plain_password), hashed_password.encode())
+
+def needs_rehash(hashed_password: str) -> bool:
+    if not is_password_hash(hashed_password):
+        return True
+    return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    """Return ``(valid, new_hash)``; ``new_hash`` is set when the stored hash should be replaced."""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+async def _run_password_job(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+    finally:
+        _password_slots.release()
+
+async def hash_password_async(plain_password: str) -> str:
+    return await _run_password_job(get_password_hash, plain_password)
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    return await _run_password_job(verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, is_admin: bool = False):
     to_encode = data.copy()
@@ -40,6 +96,16 @@ def create_access_token(data: dict, is_admin: bool = False):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def _load_principal(db: Session, username: str):
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        return None
+    # never keep the password hash in memory longer than needed
+    principal = row_to_dict(user)
+    principal.pop("password", None)
+    return principal
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -50,11 +116,14 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
     
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    # a cached principal must not outlive the token that loaded it
+    ttl = max(payload.get("exp", 0) - time.time(), 0)
+    principal = principal_cache.get_or_load(username, lambda: _load_principal(db, username), ttl=ttl)
+    if principal is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
-    return user
+    # a fresh transient instance per request, so callers can't mutate the cached copy
+    return User(**principal)
     
 def verify_admin(user: User):
     if not user.is_admin:
@@ -0,0 +1,101 @@
+"""Compare the sync routes in main.py with their /async counterparts.
+
+Drives both variants of the same read endpoints in-process at a fixed
+concurrency and prints throughput and latency percentiles. It only reads, so
+point DATABASE_URL at a seeded database before running::
+
+    python -m benchmarks.async_vs_sync --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlalchemy import select
+
+from database import session
+from database_models import Cart, Transaction
+from main import app
+
+
+def pick_ids():
+    db = session()
+    try:
+        buyer_id = db.execute(select(Cart.buyer_id).limit(1)).scalar() or 1
+        transaction_id = db.execute(select(Transaction.id).limit(1)).scalar() or 1
+    finally:
+        db.close()
+    return buyer_id, transaction_id
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(path: str, concurrency: int, total: int):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+async def run_all(paths, concurrency: int, total: int):
+    # one event loop for every scenario: the async engine's pool is bound to it
+    print(f"{'path':<32}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for path in paths:
+        for variant in (path, "/async" + path):
+            result = await run(variant, concurrency, total)
+            print(
+                f"{result['path']:<32}{result['rps']:>10.0f}{result['p50_ms']:>10.1f}"
+                f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    buyer_id, transaction_id = pick_ids()
+    paths = [
+        "/product/?limit=24",
+        f"/cart/{buyer_id}",
+        f"/transaction/{transaction_id}",
+    ]
+    asyncio.run(run_all(paths, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
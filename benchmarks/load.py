@@ -0,0 +1,291 @@
+"""Drive a mix of shopper and admin scenarios and report latency per endpoint.
+
+Workers run scenarios back to back at a fixed concurrency for a fixed time;
+each scenario is a short sequence of requests a real client would make:
+
+- browse: first page of the catalog, the next page, a category page and a search
+- detail: a product and its reviews
+- cart: add a product to a buyer's cart, then view the cart
+- checkout: add a product, then check the cart out
+- admin: change a product's price
+
+Throughput and p50/p95/p99 latency are reported per endpoint (route
+template, not raw path) and saved as JSON, so two runs can be compared with
+``--baseline``. Point DATABASE_URL at a database filled by
+``benchmarks.seed``; the ids used come from it. The app runs in-process
+unless ``--url`` names a running server (start that one with
+``RATE_LIMIT_ENABLED=false``; every request comes from the same client)::
+
+    python -m benchmarks.load --concurrency 32 --duration 60
+    python -m benchmarks.load --url http://127.0.0.1:8000 --baseline results/before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from sqlalchemy import func, select
+
+# every request comes from one client, so the per-IP limits would measure nothing but 429s
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from auth import create_access_token
+from benchmarks.async_vs_sync import percentile
+from benchmarks.seed import USERNAME_PREFIX, WORDS
+from database import engine, session
+from database_models import Cart, Category, History, Product, Review, Transaction, User
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_MIX = "browse=50,detail=30,cart=12,checkout=5,admin=3"
+PAGE_SIZE = 24
+
+
+class Target:
+    """Ids the scenarios pick from, read from the database once."""
+
+    def __init__(self):
+        db = session()
+        try:
+            self.buyer_ids = db.execute(
+                select(User.id).where(User.username.startswith(USERNAME_PREFIX), User.is_admin.is_(False))
+            ).scalars().all()
+            admin = db.execute(select(User.username).where(User.is_admin.is_(True)).limit(1)).scalar()
+            self.category_ids = db.execute(select(Category.id)).scalars().all()
+            low, high = db.execute(select(func.min(Product.id), func.max(Product.id))).one()
+        finally:
+            db.close()
+        if not self.buyer_ids or low is None:
+            raise SystemExit("no seeded users or products; run python -m benchmarks.seed first")
+        if admin is None:
+            raise SystemExit("no admin user to run the admin scenario as")
+        self.product_ids = range(low, high + 1)
+        self.admin_headers = {"Authorization": "Bearer " + create_access_token({"sub": admin}, True)}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+        self.elapsed = 0.0
+
+    async def request(self, client, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        if self.recording:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            self.statuses[endpoint][status] += 1
+        return response
+
+
+async def browse(client, rec: Recorder, target: Target, rng: random.Random):
+    response = await rec.request(client, "GET /product/", "GET", "/product/", params={"limit": PAGE_SIZE})
+    cursor = response.json().get("next_cursor") if response is not None and response.status_code == 200 else None
+    if cursor:
+        await rec.request(client, "GET /product/", "GET", "/product/", params={"limit": PAGE_SIZE, "cursor": cursor})
+    if target.category_ids:
+        params = {"limit": PAGE_SIZE, "category_id": rng.choice(target.category_ids), "sort": "price_asc"}
+        await rec.request(client, "GET /product/", "GET", "/product/", params=params)
+    await rec.request(client, "GET /product/search", "GET", "/product/search", params={"q": rng.choice(WORDS)})
+
+
+async def detail(client, rec: Recorder, target: Target, rng: random.Random):
+    product_id = rng.choice(target.product_ids)
+    await rec.request(client, "GET /product/{product_id}", "GET", f"/product/{product_id}")
+    await rec.request(client, "GET /product/{product_id}/reviews", "GET", f"/product/{product_id}/reviews")
+
+
+async def add_to_cart(client, rec: Recorder, target: Target, rng: random.Random):
+    buyer_id = rng.choice(target.buyer_ids)
+    body = {"buyer_id": buyer_id, "product_id": rng.choice(target.product_ids), "quantity": 1}
+    await rec.request(client, "POST /cart/", "POST", "/cart/", json=body)
+    return buyer_id
+
+
+async def cart(client, rec: Recorder, target: Target, rng: random.Random):
+    buyer_id = await add_to_cart(client, rec, target, rng)
+    await rec.request(client, "GET /cart/{buyer_id}", "GET", f"/cart/{buyer_id}")
+
+
+async def checkout(client, rec: Recorder, target: Target, rng: random.Random):
+    buyer_id = await add_to_cart(client, rec, target, rng)
+    await rec.request(client, "POST /checkout/{buyer_id}", "POST", f"/checkout/{buyer_id}")
+
+
+async def admin(client, rec: Recorder, target: Target, rng: random.Random):
+    product_id = rng.choice(target.product_ids)
+    body = {"price": round(rng.uniform(5, 500), 2)}
+    await rec.request(
+        client, "PUT /product/{product_id}", "PUT", f"/product/{product_id}", json=body, headers=target.admin_headers
+    )
+
+
+SCENARIOS = {"browse": browse, "detail": detail, "cart": cart, "checkout": checkout, "admin": admin}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def drive(client, target: Target, mix: dict, concurrency: int, duration: float, warmup: float, seed: int):
+    rec = Recorder()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + warmup + duration
+
+    async def worker(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            await SCENARIOS[rng.choices(names, weights)[0]](client, rec, target, rng)
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        rec.recording = True
+        return time.perf_counter()
+
+    recording = asyncio.create_task(start_recording())
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    # scenarios still running at the deadline are finished, so this is a little over duration
+    rec.elapsed = time.perf_counter() - await recording
+    return rec
+
+
+def summarize(latencies: list, statuses: dict, duration: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / duration, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "errors": sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def data_volumes() -> dict:
+    db = session()
+    try:
+        return {
+            model.__tablename__: db.execute(select(func.count()).select_from(model)).scalar()
+            for model in (User, Category, Product, Cart, Transaction, History, Review)
+        }
+    finally:
+        db.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results: dict, baseline: dict = None):
+    previous = (baseline or {}).get("endpoints", {})
+    print(f"{'endpoint':<36}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    rows = [*sorted(results["endpoints"].items()), ("total", results["total"])]
+    for endpoint, stats in rows:
+        print(
+            f"{endpoint:<36}{stats['requests']:>10}{stats['rps']:>10.1f}{stats['p50_ms']:>10.1f}"
+            f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['errors']:>8}"
+        )
+        before = (baseline or {}).get("total") if endpoint == "total" else previous.get(endpoint)
+        if before:
+            changes = "  ".join(
+                f"{key} {(stats[key] - before[key]) / before[key] * 100:+.1f}%"
+                for key in ("rps", "p50_ms", "p95_ms", "p99_ms") if before[key]
+            )
+            print(f"{'':<36}vs baseline: {changes}")
+
+
+async def run(args) -> dict:
+    started_at = datetime.now(timezone.utc).isoformat()
+    target = Target()
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout)
+    else:
+        from main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+    async with client:
+        rec = await drive(client, target, mix, args.concurrency, args.duration, args.warmup, args.seed)
+
+    all_latencies = [latency for latencies in rec.latencies.values() for latency in latencies]
+    all_statuses = defaultdict(int)
+    for statuses in rec.statuses.values():
+        for status, count in statuses.items():
+            all_statuses[status] += count
+    if not all_latencies:
+        raise SystemExit("no requests completed; increase --duration")
+
+    return {
+        "started_at": started_at,
+        "commit": git_commit(),
+        "target": args.url or "in-process",
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "duration_s": round(rec.elapsed, 3),
+        "warmup_s": args.warmup,
+        "mix": mix,
+        "seed": args.seed,
+        "data": data_volumes(),
+        "endpoints": {
+            endpoint: summarize(latencies, rec.statuses[endpoint], rec.elapsed)
+            for endpoint, latencies in rec.latencies.items()
+        },
+        "total": summarize(all_latencies, all_statuses, rec.elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. browse=1,detail=1")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the scenario choices")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--url", help="base URL of a running server; default is the app in-process")
+    parser.add_argument("--output", type=Path, help="where to save the JSON results (default benchmarks/results/)")
+    parser.add_argument("--baseline", type=Path, help="earlier results to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    report(results, baseline)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
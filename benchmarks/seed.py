@@ -0,0 +1,220 @@
+"""Fill the database at DATABASE_URL with generated data for benchmarking.
+
+Rows are generated from a fixed random seed and written with executemany in
+chunks of ``CHUNK_SIZE``, so millions of products never sit in memory at
+once and the same arguments always produce the same data. Ids continue from the largest id already in
+each table, so seeding twice adds a second batch instead of failing::
+
+    python -m benchmarks.seed --products 1000000 --users 10000
+
+The schema is brought up to date with alembic first. Every seeded user has
+the password ``PASSWORD``; the first one is an admin. Review aggregates and
+the sales rollups are rebuilt at the end.
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, insert, select, text
+
+import ratings
+import rollups
+from auth import get_password_hash
+from database import engine, session
+from database_models import Cart, Category, History, Product, Review, Transaction, User
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+PASSWORD = "bench-password"
+USERNAME_PREFIX = "bench"
+CHUNK_SIZE = 10000
+
+COLORS = ("black", "white", "red", "blue", "green", "grey", None)
+SIZES = ("XS", "S", "M", "L", "XL", None)
+WORDS = (
+    "cotton", "linen", "classic", "slim", "relaxed", "vintage", "organic", "wool", "denim", "leather",
+    "running", "winter", "summer", "travel", "premium", "everyday", "waterproof", "lightweight",
+)
+KINDS = ("shirt", "jacket", "sneakers", "backpack", "hoodie", "jeans", "dress", "scarf", "boots", "cap")
+STATUSES = ("Completed", "Completed", "Completed", "Pending", "Cancelled")
+
+
+def chunked(rows, size: int = CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def price_of(product_id: int) -> float:
+    # derived from the id so transaction amounts can be computed without a lookup
+    return round(5 + (product_id * 7919 % 49500) / 100, 2)
+
+
+def pairs(rng, count: int, buyers: range, products: range):
+    """``count`` distinct (buyer, product) pairs, as the unique indexes require."""
+    count = min(count, len(buyers) * len(products))
+    seen = set()
+    while len(seen) < count:
+        pair = (rng.choice(buyers), rng.choice(products))
+        if pair not in seen:
+            seen.add(pair)
+            yield pair
+
+
+def product_rows(rng, product_ids: range, seller_id: int, category_ids: range):
+    for product_id in product_ids:
+        quantity = rng.randint(0, 500)
+        yield {
+            "id": product_id,
+            "seller_id": seller_id,
+            "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(KINDS)} {product_id}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+            "price": price_of(product_id),
+            "quantity": quantity,
+            "size": rng.choice(SIZES),
+            "color": rng.choice(COLORS),
+            "stock_status": quantity > 0,
+            "category_id": rng.choice(category_ids) if category_ids else None,
+            "is_deleted": False,
+        }
+
+
+def insert_rows(conn, model, rows) -> int:
+    total = 0
+    for chunk in chunked(rows):
+        conn.execute(insert(model), chunk)
+        total += len(chunk)
+    return total
+
+
+def seed(users: int, categories: int, products: int, carts: int, transactions: int, reviews: int, random_seed: int = 42):
+    """Insert the requested number of rows per table; return the counts actually inserted."""
+    rng = random.Random(random_seed)
+    password = get_password_hash(PASSWORD)
+    counts = {}
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+
+        first_user = next_id(conn, User)
+        counts["user"] = insert_rows(conn, User, (
+            {
+                "id": user_id,
+                "username": f"{USERNAME_PREFIX}{user_id}",
+                "email": f"{USERNAME_PREFIX}{user_id}@example.com",
+                "password": password,
+                "role": "admin" if user_id == first_user else "user",
+                "address": f"{user_id} Benchmark Street",
+                "phone_number": f"555{user_id:07d}",
+                "is_admin": user_id == first_user,
+            }
+            for user_id in range(first_user, first_user + users)
+        ))
+        user_ids = range(first_user, first_user + users)
+
+        first_category = next_id(conn, Category)
+        counts["category"] = insert_rows(conn, Category, (
+            {"id": category_id, "name": f"{USERNAME_PREFIX} category {category_id}", "description": None}
+            for category_id in range(first_category, first_category + categories)
+        ))
+        category_ids = range(first_category, first_category + categories)
+
+        first_product = next_id(conn, Product)
+        product_ids = range(first_product, first_product + products)
+        counts["product"] = insert_rows(conn, Product, product_rows(rng, product_ids, first_user, category_ids))
+
+        if user_ids and product_ids:
+            counts["cart"] = insert_rows(conn, Cart, (
+                {"buyer_id": buyer_id, "product_id": product_id, "quantity": rng.randint(1, 3)}
+                for buyer_id, product_id in pairs(rng, carts, user_ids, product_ids)
+            ))
+            counts["review"] = insert_rows(conn, Review, (
+                {
+                    "buyer_id": buyer_id,
+                    "product_id": product_id,
+                    "rating": rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 6, 6))[0],
+                    "comment": " ".join(rng.choice(WORDS) for _ in range(8)),
+                }
+                for buyer_id, product_id in pairs(rng, reviews, user_ids, product_ids)
+            ))
+
+            first_transaction = next_id(conn, Transaction)
+            orders = []
+            lines = []
+            counts["transaction"] = counts["history"] = 0
+            for transaction_id in range(first_transaction, first_transaction + transactions):
+                buyer_id = rng.choice(user_ids)
+                order_status = rng.choice(STATUSES)
+                amount = 0.0
+                for product_id in rng.sample(product_ids, min(rng.randint(1, 4), len(product_ids))):
+                    quantity = rng.randint(1, 3)
+                    amount += quantity * price_of(product_id)
+                    lines.append({
+                        "buyer_id": buyer_id,
+                        "product_id": product_id,
+                        "transaction_id": transaction_id,
+                        "quantity": quantity,
+                        "status": order_status,
+                    })
+                orders.append({"id": transaction_id, "buyer_id": buyer_id, "amount": round(amount, 2), "status": order_status})
+                if len(orders) == CHUNK_SIZE:
+                    counts["transaction"] += insert_rows(conn, Transaction, orders)
+                    counts["history"] += insert_rows(conn, History, lines)
+                    orders, lines = [], []
+            counts["transaction"] += insert_rows(conn, Transaction, orders)
+            counts["history"] += insert_rows(conn, History, lines)
+
+        if conn.dialect.name == "postgresql":
+            # ids were given explicitly, so the serial sequences have to catch up
+            for model in (User, Category, Product, Cart, Review, Transaction, History):
+                table = model.__tablename__
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                    f"coalesce((SELECT max(id) FROM \"{table}\"), 0) + 1, false)"
+                ))
+
+    db = session()
+    try:
+        ratings.rebuild(db)
+        rollups.rebuild(db)
+    finally:
+        db.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--carts", type=int, default=5000, help="cart lines")
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--reviews", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    args = parser.parse_args()
+
+    command.upgrade(Config(str(ALEMBIC_INI)), "head")
+    started = time.perf_counter()
+    counts = seed(
+        args.users, args.categories, args.products, args.carts, args.transactions, args.reviews, args.seed
+    )
+    elapsed = time.perf_counter() - started
+    print(", ".join(f"{count} {table}" for table, count in counts.items()), f"in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
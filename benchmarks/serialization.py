@@ -0,0 +1,88 @@
+"""Time how long a page of products takes to turn into a response body.
+
+Compares the path GET /product/ used to take (ORM objects in a dict, run
+through jsonable_encoder and rendered with json.dumps) with the typed one
+(ProductPageResponse validated from the ORM objects, dumped by pydantic and
+rendered with orjson). Needs no database::
+
+    python -m benchmarks.serialization --products 10000
+"""
+import argparse
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from database_models import Product
+from models import ProductPageResponse
+
+
+def make_page(count: int):
+    products = [
+        Product(
+            id=i,
+            seller_id=1,
+            name=f"Product {i}",
+            description=f"Description of product {i}",
+            price=9.99 + i,
+            quantity=i % 50,
+            size="M",
+            color="black",
+            stock_status=True,
+            category_id=i % 20 + 1,
+            is_deleted=False,
+            rating_count=i % 7,
+            rating_sum=(i % 7) * 4,
+            rating_avg=4.0 if i % 7 else 0.0,
+        )
+        for i in range(1, count + 1)
+    ]
+    return {"status": "success", "count": count, "next_cursor": None, "data": products}
+
+
+def untyped(page):
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+def typed(response_class):
+    # what FastAPI does for a route with response_model=ProductPageResponse
+    adapter = TypeAdapter(ProductPageResponse)
+
+    def render(page):
+        value = adapter.validate_python(page, from_attributes=True)
+        return response_class(adapter.dump_python(value, mode="json")).body
+
+    return render
+
+
+def measure(render, page, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = render(page)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    page = make_page(args.products)
+    variants = [
+        ("jsonable_encoder + json", untyped),
+        ("response model + json", typed(JSONResponse)),
+        ("response model + orjson", typed(ORJSONResponse)),
+    ]
+    print(f"{'variant':<28}{'median ms':>12}{'bytes':>12}")
+    for name, render in variants:
+        elapsed_ms, size = measure(render, page, args.repeat)
+        print(f"{name:<28}{elapsed_ms:>12.1f}{size:>12}")
+
+
+if __name__ == "__main__":
+    main()
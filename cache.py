@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class EntityCache:
+    """Thread-safe LRU cache with a per-entry TTL and single-flight loading.
+
+    Values are plain dicts/lists rather than ORM instances so they can be
+    shared between sessions. The cache is per process; with several workers
+    the TTL bounds how long another worker can serve a stale entry.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+        # bumped on every invalidation so a load that raced a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        Concurrent misses for the same key share one ``loader()`` call.
+        ``None`` results are returned but not cached. ``ttl`` caps the
+        lifetime of an entry stored by this call below the cache default.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._inflight[key] = _Flight()
+                leader = True
+            generation = self._generation
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if flight.error is None and flight.value is not None and generation == self._generation:
+                    self._store(key, flight.value, ttl)
+            flight.done.set()
+        return flight.value
+
+    async def aget_or_load(self, key, loader, ttl=None):
+        """Async counterpart of :meth:`get_or_load`; ``loader`` is a coroutine function."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            flight = self._async_inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                leader = True
+            generation = self._generation
+
+        if not leader:
+            return await asyncio.shield(flight)
+
+        try:
+            value = await loader()
+        except BaseException as e:
+            with self._lock:
+                self._async_inflight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                flight.cancel()
+            else:
+                flight.set_exception(e)
+                flight.exception()  # mark retrieved when nobody else was waiting
+            raise
+        with self._lock:
+            self._async_inflight.pop(key, None)
+            if value is not None and generation == self._generation:
+                self._store(key, value, ttl)
+        flight.set_result(value)
+        return value
+
+    def _lookup(self, key):
+        # caller holds self._lock
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._data[key]
+        self.misses += 1
+        return False, None
+
+    def _store(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+            }
+
+
+def row_to_dict(row):
+    """Column values of an ORM row, in the shape FastAPI would serialize it."""
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+
+product_cache = EntityCache("product", maxsize=10000, ttl=300)
+category_cache = EntityCache("category", maxsize=1000, ttl=300)
+category_list_cache = EntityCache("category_list", maxsize=1, ttl=300)
+# keyed by username; auth.get_current_user also caps entries at the token's exp
+principal_cache = EntityCache("principal", maxsize=10000, ttl=60)
+
+ALL_CACHES = [product_cache, category_cache, category_list_cache, principal_cache]
@@ -0,0 +1,134 @@
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import etags
+import rollups
+from database_models import Cart, History, Product, ProductImage, Transaction
+
+
+LINE_FIELDS = (
+    "id", "buyer_id", "product_id", "quantity",
+    "name", "price", "stock", "stock_status", "image_url", "line_total",
+)
+
+
+def cart_view_statement(buyer_id: int):
+    """One SELECT for a buyer's whole cart.
+
+    Each line carries its product's name, price, stock and first image, and
+    the line and cart totals are computed by the database, so rendering the
+    cart is a single round trip however many lines it has.
+    """
+    primary_image = (
+        select(ProductImage.image_url)
+        .where(ProductImage.product_id == Cart.product_id)
+        .order_by(ProductImage.id)
+        .limit(1)
+        .correlate(Cart)
+        .scalar_subquery()
+    )
+    line_total = Cart.quantity * Product.price
+    return (
+        select(
+            Cart.id,
+            Cart.buyer_id,
+            Cart.product_id,
+            Cart.quantity,
+            Product.name,
+            Product.price,
+            Product.quantity.label("stock"),
+            Product.stock_status,
+            primary_image.label("image_url"),
+            line_total.label("line_total"),
+            func.sum(line_total).over().label("cart_total"),
+            func.sum(Cart.quantity).over().label("item_count"),
+        )
+        .join(Product, Product.id == Cart.product_id)
+        .where(Cart.buyer_id == buyer_id)
+        .order_by(Cart.id)
+    )
+
+
+def build_cart_view(rows):
+    lines = [{field: row._mapping[field] for field in LINE_FIELDS} for row in rows]
+    return {
+        "status": "success",
+        "count": len(lines),
+        "item_count": rows[0].item_count if rows else 0,
+        "total": rows[0].cart_total if rows else 0,
+        "data": lines
+    }
+
+
+def checkout_cart(db: Session, buyer_id: int, payment_status: str = "Completed"):
+    """Turn a buyer's cart into a Transaction and History rows in one transaction.
+
+    Stock is decremented with a single conditional UPDATE ... FROM cart, so a
+    line whose product no longer has enough stock makes the whole checkout
+    fail instead of overselling. On PostgreSQL the cart and product rows are
+    locked up front in product id order, so concurrent checkouts serialize
+    without deadlocking. The number of statements does not depend on cart size.
+    The caller commits.
+    """
+    lines = db.execute(
+        select(Cart.product_id, Cart.quantity, Product.price, Product.category_id)
+        .join(Product, Product.id == Cart.product_id)
+        .where(Cart.buyer_id == buyer_id)
+        .order_by(Cart.product_id)
+        .with_for_update(of=[Cart, Product])
+    ).all()
+    if not lines:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+
+    remaining = Product.quantity - Cart.quantity
+    reserved = db.execute(
+        update(Product)
+        .where(
+            Product.id == Cart.product_id,
+            Cart.buyer_id == buyer_id,
+            Product.quantity >= Cart.quantity,
+        )
+        .values(quantity=remaining, stock_status=remaining > 0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if reserved != len(lines):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Some items in the cart are no longer available in the requested quantity"
+        )
+
+    amount = sum(line.quantity * line.price for line in lines)
+    transaction_id = db.execute(
+        insert(Transaction)
+        .values(buyer_id=buyer_id, amount=amount, status=payment_status)
+        .returning(Transaction.id)
+    ).scalar_one()
+
+    db.execute(insert(History), [
+        {
+            "buyer_id": buyer_id,
+            "product_id": line.product_id,
+            "transaction_id": transaction_id,
+            "quantity": line.quantity,
+            "status": payment_status,
+        }
+        for line in lines
+    ])
+    db.execute(delete(Cart).where(Cart.buyer_id == buyer_id))
+    rollups.record_order(db)
+    rollups.record_sales(db, [(line.product_id, line.category_id, line.quantity, line.price) for line in lines])
+    # last: every checkout takes this one row's lock, so hold it for as short as possible
+    etags.bump_version(db, "product")
+
+    return {
+        "id": transaction_id,
+        "buyer_id": buyer_id,
+        "amount": amount,
+        "status": payment_status,
+        "items": [
+            {"product_id": line.product_id, "quantity": line.quantity, "price": line.price}
+            for line in lines
+        ]
+    }
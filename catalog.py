@@ -0,0 +1,134 @@
+import base64
+import json
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database_models import Product
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# sort key -> (column the keyset is built on, descending?)
+SORT_KEYS = {
+    "id": (Product.id, False),
+    "newest": (Product.id, True),
+    "price_asc": (Product.price, False),
+    "price_desc": (Product.price, True),
+}
+
+
+def pack_cursor(sort: str, value, last_id: int) -> str:
+    payload = [sort, value, last_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def encode_cursor(sort: str, product: Product) -> str:
+    column, _ = SORT_KEYS[sort]
+    return pack_cursor(sort, getattr(product, column.key), product.id)
+
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not match sort order")
+    return value, last_id
+
+
+def filter_products(
+    query,
+    category_ids: Optional[List[int]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    color: Optional[str] = None,
+    size: Optional[str] = None,
+):
+    if category_ids:
+        if len(category_ids) == 1:
+            query = query.filter(Product.category_id == category_ids[0])
+        else:
+            query = query.filter(Product.category_id.in_(category_ids))
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    if in_stock is not None:
+        query = query.filter(Product.stock_status == in_stock)
+    if color:
+        query = query.filter(Product.color == color)
+    if size:
+        query = query.filter(Product.size == size)
+    return query
+
+
+def product_page_statement(
+    category_ids: Optional[List[int]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    color: Optional[str] = None,
+    size: Optional[str] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+):
+    """Build the SELECT for one page of products.
+
+    Pages are fetched with keyset pagination on ``(sort column, id)`` so the
+    cost of a page does not grow with how deep into the catalog it is. The
+    statement fetches one extra row so :func:`split_page` can tell whether
+    another page exists without a COUNT(*).
+    """
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown sort key '{sort}'")
+    column, descending = SORT_KEYS[sort]
+
+    query = filter_products(select(Product), category_ids, min_price, max_price, in_stock, color, size)
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if column is Product.id:
+            query = query.filter(Product.id < last_id if descending else Product.id > last_id)
+        elif descending:
+            query = query.filter(tuple_(column, Product.id) < tuple_(value, last_id))
+        else:
+            query = query.filter(tuple_(column, Product.id) > tuple_(value, last_id))
+
+    if column is Product.id:
+        order = [Product.id.desc() if descending else Product.id.asc()]
+    elif descending:
+        order = [column.desc(), Product.id.desc()]
+    else:
+        order = [column.asc(), Product.id.asc()]
+
+    return query.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows, sort: str, limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1])
+    return rows, next_cursor
+
+
+def list_products(db: Session, sort: str = "id", limit: int = DEFAULT_PAGE_SIZE, **filters):
+    """Return one page of products and the cursor for the next page."""
+    statement = product_page_statement(sort=sort, limit=limit, **filters)
+    rows = db.execute(statement).scalars().all()
+    return split_page(rows, sort, limit)
+
+
+async def alist_products(db: AsyncSession, sort: str = "id", limit: int = DEFAULT_PAGE_SIZE, **filters):
+    """Async counterpart of :func:`list_products`."""
+    statement = product_page_statement(sort=sort, limit=limit, **filters)
+    rows = (await db.execute(statement)).scalars().all()
+    return split_page(rows, sort, limit)
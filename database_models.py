@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, LargeBinary, Boolean, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Float, LargeBinary, Boolean, Date, DateTime, ForeignKey, Index, DDL, event, func
 from sqlalchemy.ext.declarative import declarative_base 
 from datetime import datetime
 from sqlalchemy.orm import relationship
@@ -31,12 +31,51 @@ class Product(Base):
     category_id = Column(Integer, ForeignKey("category.id"), nullable=True)
     seller = relationship("User", backref="products")
     is_deleted = Column(Boolean, default=False)
+    # review aggregates, kept current by ratings.apply_rating on every review write
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_avg = Column(Float, nullable=False, default=0, server_default="0")
     #category = relationship("Category", backref="products")
 
+    # keyset pagination indexes for GET /product/ (see catalog.py)
+    __table_args__ = (
+        Index("ix_product_category_id_id", "category_id", "id"),
+        Index("ix_product_category_id_price_id", "category_id", "price", "id"),
+        Index("ix_product_price_id", "price", "id"),
+        # top rated in category (see ratings.py)
+        Index("ix_product_category_id_rating_avg_id", "category_id", "rating_avg", "id"),
+    )
+
+# Full-text search over product name/description (see search.py).
+# PostgreSQL gets a GIN expression index; SQLite gets an FTS5 table that
+# mirrors product and is kept current by triggers.
+PRODUCT_SEARCH_DDL = {
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_product_search ON product "
+        "USING gin (to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '')))",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "name, description, content='product', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+        "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    ],
+}
+
+for dialect, statements in PRODUCT_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+
+
 class ProductImage(Base):
     __tablename__ = "productimage"
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("product.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("product.id"), nullable=False, index=True)
     image_url = Column(String, nullable=False)
 
 
@@ -49,11 +88,16 @@ class Cart(Base):
     buyer = relationship("User", backref="cart_items")
     product = relationship("Product", backref="cart_items")
 
+    __table_args__ = (
+        # one line per product in a buyer's cart; also serves lookups by buyer
+        Index("uq_cart_buyer_id_product_id", "buyer_id", "product_id", unique=True),
+    )
+
 
 class Transaction(Base):
     __tablename__ = "transaction"
     id = Column(Integer, primary_key=True, index=True)
-    buyer_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    buyer_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
     amount = Column(Float, nullable=False)
     status = Column(String, nullable=False)
     user = relationship("User", backref="transactions")
@@ -62,9 +106,9 @@ class Transaction(Base):
 class History(Base):
     __tablename__ = "history"
     id = Column(Integer, primary_key=True, index=True)
-    buyer_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    buyer_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("product.id"), nullable=False)
-    transaction_id = Column(Integer, ForeignKey("transaction.id"), nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transaction.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     status = Column(String, nullable=False)
     user = relationship("User", backref="history")
@@ -89,6 +133,56 @@ class Review(Base):
     user = relationship("User", backref="reviews")
     product = relationship("Product", backref="reviews")
 
-
-
-
+    __table_args__ = (
+        # one review per buyer and product; create_review relies on it
+        Index("uq_review_buyer_id_product_id", "buyer_id", "product_id", unique=True),
+        # per-product review feed, newest first or by rating (see ratings.py)
+        Index("ix_review_product_id_id", "product_id", "id"),
+        Index("ix_review_product_id_rating_id", "product_id", "rating", "id"),
+    )
+
+
+class TableVersion(Base):
+    """Change counter per table (or per row, e.g. "productimage:42").
+
+    Bumped by the write handlers so conditional GETs can be answered with a
+    primary key lookup instead of loading the rows (see etags.py).
+    """
+    __tablename__ = "table_version"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# Sales rollups, maintained incrementally by rollups.record_sales/record_order
+# whenever history and transaction rows are written.
+class ProductSales(Base):
+    __tablename__ = "sales_product"
+    product_id = Column(Integer, ForeignKey("product.id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_sales_product_revenue", "revenue"),
+        Index("ix_sales_product_units", "units"),
+    )
+
+
+class CategorySales(Base):
+    __tablename__ = "sales_category"
+    # 0 collects products without a category
+    category_id = Column(Integer, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_sales_category_revenue", "revenue"),
+        Index("ix_sales_category_units", "units"),
+    )
+
+
+class DailySales(Base):
+    __tablename__ = "sales_daily"
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
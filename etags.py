@@ -0,0 +1,90 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database_models import TableVersion
+from rollups import UPSERT_INSERTS
+
+
+CATALOG_CACHE_CONTROL = "public, no-cache"
+
+
+def get_version(db: Session, name: str) -> int:
+    version = db.execute(select(TableVersion.version).where(TableVersion.name == name)).scalar()
+    return version or 0
+
+
+async def aget_version(db: AsyncSession, name: str) -> int:
+    version = (await db.execute(select(TableVersion.version).where(TableVersion.name == name))).scalar()
+    return version or 0
+
+
+def bump_version(db: Session, name: str):
+    """Increment the version for ``name`` as part of the caller's transaction.
+
+    The session's pending writes are flushed first, so every path locks the
+    rows it changes before the version row, never the other way round (two
+    transactions taking the two in opposite orders can deadlock). Call it
+    last, just before commit, to hold the version row's lock briefly. A
+    missing row is created with an upsert, so two first writers can't both
+    insert it.
+    """
+    db.flush()
+    dialect_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(TableVersion).values(name=name, version=1)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[TableVersion.name], set_={"version": TableVersion.version + 1}
+        ))
+        return
+    result = db.execute(
+        update(TableVersion).where(TableVersion.name == name).values(version=TableVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(TableVersion).values(name=name, version=1))
+
+
+def make_etag(name: str, version: int, variant: str = "") -> str:
+    # the variant (e.g. the query string) distinguishes representations that
+    # share a version, such as different pages of the same listing
+    digest = hashlib.sha1(f"{name}:{version}:{variant}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match uses weak comparison
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def check_not_modified(request: Request, response: Response, db: Session, name: str, variant: str = "",
+                       version: Optional[int] = None):
+    """Set ETag/Cache-Control on ``response``; return a 304 response if the client is current.
+
+    Pass ``version`` when the caller has already read it, e.g. to key a cache
+    of the body by the same version the ETag names.
+    """
+    if version is None:
+        version = get_version(db, name)
+    return _conditional_response(request, response, make_etag(name, version, variant))
+
+
+async def acheck_not_modified(request: Request, response: Response, db: AsyncSession, name: str, variant: str = ""):
+    return _conditional_response(request, response, make_etag(name, await aget_version(db, name), variant))
+
+
+def _conditional_response(request: Request, response: Response, etag: str):
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
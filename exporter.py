@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from database import session
+from database_models import History, Transaction
+
+
+# rows fetched per round trip from the server-side cursor
+YIELD_PER = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def transaction_export_statement(buyer_id: Optional[int] = None, status: Optional[str] = None):
+    statement = select(Transaction.id, Transaction.buyer_id, Transaction.amount, Transaction.status)
+    if buyer_id is not None:
+        statement = statement.where(Transaction.buyer_id == buyer_id)
+    if status is not None:
+        statement = statement.where(Transaction.status == status)
+    return statement.order_by(Transaction.id)
+
+
+def history_export_statement(
+    buyer_id: Optional[int] = None,
+    status: Optional[str] = None,
+    transaction_id: Optional[int] = None,
+):
+    statement = select(
+        History.id, History.buyer_id, History.product_id, History.transaction_id, History.quantity, History.status
+    )
+    if buyer_id is not None:
+        statement = statement.where(History.buyer_id == buyer_id)
+    if status is not None:
+        statement = statement.where(History.status == status)
+    if transaction_id is not None:
+        statement = statement.where(History.transaction_id == transaction_id)
+    return statement.order_by(History.id)
+
+
+def _encode_batches(rows, columns, fmt: str):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    for partition in rows.partitions():
+        for row in partition:
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row))))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _stream(statement, fmt: str):
+    # the generator owns its session: it is consumed after the request's
+    # dependencies (and their sessions) may already have been closed
+    db = session()
+    try:
+        rows = db.execute(statement.execution_options(yield_per=YIELD_PER))
+        yield from _encode_batches(rows, list(rows.keys()), fmt)
+    finally:
+        db.close()
+
+
+def export_response(statement, fmt: str, filename: str) -> StreamingResponse:
+    """Stream ``statement``'s rows as NDJSON or CSV without materializing them."""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Export format must be 'ndjson' or 'csv'")
+    return StreamingResponse(
+        _stream(statement, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,186 @@
+"""Build and serve the static frontend.
+
+``python frontend.py build`` copies the pages and their assets into
+``FRONTEND_DIST``. Every asset except the HTML pages is renamed after a hash
+of its content (``products.css`` -> ``products.3f2a9c1b0d.css``) and the
+references to it in pages, stylesheets and scripts are rewritten. Text files
+also get ``.gz`` and ``.br`` siblings.
+
+The app mounts the build at ``/app`` with :class:`FrontendFiles`, which sends
+the precompressed sibling the client accepts. Fingerprinted files are
+immutable and cached for a year; pages are revalidated on every visit, so a
+repeat visit costs one 304 per page and nothing for the assets.
+
+Command line::
+
+    python frontend.py build [--clean]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+
+SOURCE_DIR = Path(__file__).resolve().parent
+DIST_DIR = Path(os.environ.get("FRONTEND_DIST", SOURCE_DIR / "dist")).resolve()
+MANIFEST = "manifest.json"
+
+PAGE_TYPES = {".html"}
+ASSET_TYPES = {".css", ".js", ".svg", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".ico"}
+# files whose references to other assets are rewritten, and which are worth compressing
+TEXT_TYPES = {".html", ".css", ".js", ".svg"}
+# assets are built after what they can reference, pages last
+BUILD_ORDER = {".css": 1, ".js": 2, ".html": 3}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PAGE_CACHE_CONTROL = "no-cache"
+
+# preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{extension}"
+
+
+def rewrite_references(text: str, manifest: dict) -> str:
+    """Point quoted/url() references to built assets at their fingerprinted names.
+
+    A cache-busting query string on the old reference (``cart.js?v=2``) is dropped.
+    """
+    if not manifest:
+        return text
+    names = "|".join(re.escape(name) for name in sorted(manifest, key=len, reverse=True))
+    pattern = re.compile(rf"""(?<=["'(])({names})(\?[^"')\s]*)?(?=["')])""")
+    return pattern.sub(lambda match: manifest[match.group(1)], text)
+
+
+def precompress(path: Path, content: bytes):
+    import brotli
+
+    for suffix, compressed in (
+        (".gz", gzip.compress(content, compresslevel=9, mtime=0)),
+        (".br", brotli.compress(content, quality=11)),
+    ):
+        # not worth a variant if it doesn't save anything
+        if len(compressed) < len(content):
+            path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+def build(source: Path = SOURCE_DIR, dist: Path = DIST_DIR, clean: bool = False) -> dict:
+    """Build the frontend into ``dist``; return the manifest of renamed assets.
+
+    Files from earlier builds are kept unless ``clean`` is set, so pages that
+    are still open in a browser can load the assets they reference.
+    """
+    if clean and dist.exists():
+        shutil.rmtree(dist)
+    dist.mkdir(parents=True, exist_ok=True)
+
+    names = [
+        entry.name for entry in source.iterdir()
+        if entry.is_file() and entry.suffix.lower() in PAGE_TYPES | ASSET_TYPES
+    ]
+    names.sort(key=lambda name: (BUILD_ORDER.get(Path(name).suffix.lower(), 0), name))
+
+    manifest = {}
+    for name in names:
+        extension = Path(name).suffix.lower()
+        content = (source / name).read_bytes()
+        if extension in TEXT_TYPES:
+            content = rewrite_references(content.decode("utf-8"), manifest).encode("utf-8")
+
+        built_name = name if extension in PAGE_TYPES else fingerprint(name, content)
+        if extension not in PAGE_TYPES:
+            manifest[name] = built_name
+
+        target = dist / built_name
+        target.write_bytes(content)
+        if extension in TEXT_TYPES:
+            precompress(target, content)
+
+    (dist / MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def is_built(dist: Path = DIST_DIR) -> bool:
+    return (dist / MANIFEST).is_file()
+
+
+def accepted_encodings(header: str) -> dict:
+    """Map each coding in an Accept-Encoding header to its q value."""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class FrontendFiles(StaticFiles):
+    """Serves a build: precompressed variants by Accept-Encoding, and its cache headers."""
+
+    def __init__(self, directory: Path = DIST_DIR):
+        super().__init__(directory=directory, html=True)
+        manifest = json.loads((Path(directory) / MANIFEST).read_text())
+        self.immutable = set(manifest.values())
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if name in self.immutable else PAGE_CACHE_CONTROL,
+        }
+
+        if Path(name).suffix.lower() in TEXT_TYPES:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, suffix in ENCODINGS:
+                if accepted.get(encoding, accepted.get("*", 0)) <= 0:
+                    continue
+                try:
+                    variant_stat = os.stat(f"{full_path}{suffix}")
+                except FileNotFoundError:
+                    continue
+                full_path, stat_result = f"{full_path}{suffix}", variant_stat
+                headers["Content-Encoding"] = encoding
+                break
+
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the static frontend")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--clean", action="store_true", help="remove earlier builds first")
+    args = parser.parse_args()
+
+    manifest = build(clean=args.clean)
+    print(f"built {len(manifest)} assets into {DIST_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Resized product image variants.
+
+A variant is the source image scaled to one of ``WIDTHS`` and re-encoded as
+JPEG or WebP. It is generated on first request and written to
+``IMAGE_CACHE_DIR`` under a name derived from the source's content hash and
+the variant parameters, so identical sources share variants and a changed
+source never serves a stale one. The directory is capped at
+``IMAGE_CACHE_MAX_BYTES``; the least recently served variants are evicted
+first (recency is tracked through the files' mtime).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps
+
+
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", Path(__file__).resolve().parent)).resolve()
+IMAGE_CACHE_DIR = Path(os.environ.get("IMAGE_CACHE_DIR", MEDIA_ROOT / ".image_cache")).resolve()
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# a fixed set of widths keeps the number of variants per image bounded
+WIDTHS = (80, 160, 320, 640, 1280)
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+}
+# bump to invalidate every variant after changing the encoder settings
+VARIANT_VERSION = 1
+
+# the URL is keyed by image id, which can be reused or repointed, so caches
+# revalidate every time; the ETag (the variant key) makes that a cheap 304
+VARIANT_CACHE_CONTROL = "public, no-cache"
+
+# a hit refreshes the variant's mtime at most this often (seconds)
+TOUCH_INTERVAL = 3600
+
+_locks = {}
+_locks_guard = threading.Lock()
+_cache_bytes = None
+_cache_bytes_guard = threading.Lock()
+
+
+def negotiate_format(fmt: Optional[str], accept: str) -> str:
+    if fmt:
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be 'jpeg' or 'webp'")
+        return fmt
+    return "webp" if "image/webp" in accept else "jpeg"
+
+
+def resolve_source(image_url: str) -> Path:
+    """Map a ProductImage.image_url onto a file under MEDIA_ROOT."""
+    if "://" in image_url:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image is not stored locally")
+    path = (MEDIA_ROOT / image_url.lstrip("/")).resolve()
+    if not path.is_relative_to(MEDIA_ROOT) or path.suffix.lower() not in SOURCE_SUFFIXES or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image file not found")
+    return path
+
+
+@lru_cache(maxsize=4096)
+def _content_hash(path: Path, size: int, mtime_ns: int) -> str:
+    # size/mtime are part of the key so a replaced file is hashed again
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def variant_key(source: Path, width: int, fmt: str) -> str:
+    stat = source.stat()
+    content = _content_hash(source, stat.st_size, stat.st_mtime_ns)
+    return hashlib.sha256(f"{content}:{width}:{fmt}:{VARIANT_VERSION}".encode()).hexdigest()[:32]
+
+
+def _render(source: Path, target: Path, width: int, fmt: str):
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif pil_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        # write then rename so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=IMAGE_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, pil_format, **options)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _scan_cache():
+    files = []
+    for entry in os.scandir(IMAGE_CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    return files
+
+
+def _account(added: Path):
+    """Add a new variant's size to the running total and evict if over the cap.
+
+    The new variant itself is never evicted: it is about to be served.
+    """
+    global _cache_bytes
+    with _cache_bytes_guard:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan_cache())
+        else:
+            _cache_bytes += added.stat().st_size
+        if _cache_bytes <= IMAGE_CACHE_MAX_BYTES:
+            return
+
+        # rescan: other workers share the directory, so the total is only an estimate
+        files = sorted(_scan_cache())
+        _cache_bytes = sum(size for _, size, _ in files)
+        target = IMAGE_CACHE_MAX_BYTES * 0.9
+        for _, size, path in files:
+            if _cache_bytes <= target:
+                break
+            if path == str(added):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            _cache_bytes -= size
+
+
+def _touch(path: Path):
+    try:
+        if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_variant(image_url: str, width: int, fmt: str):
+    """Return ``(path, media_type, etag)`` of the variant, generating it if needed."""
+    if width not in WIDTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Width must be one of {', '.join(map(str, WIDTHS))}",
+        )
+    source = resolve_source(image_url)
+    key = variant_key(source, width, fmt)
+    extension = "jpg" if fmt == "jpeg" else fmt
+    target = IMAGE_CACHE_DIR / f"{key}.{extension}"
+    media_type = FORMATS[fmt][1]
+
+    if target.exists():
+        _touch(target)
+        return target, media_type, f'"{key}"'
+
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        # another request may have generated it while we waited
+        if not target.exists():
+            IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            try:
+                _render(source, target, width, fmt)
+            except (OSError, Image.DecompressionBombError):
+                raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unreadable image")
+            _account(target)
+    with _locks_guard:
+        _locks.pop(key, None)
+
+    return target, media_type, f'"{key}"'
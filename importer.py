@@ -0,0 +1,178 @@
+"""Bulk product import from CSV or NDJSON.
+
+Rows are read one at a time, validated with ``ProductCreate`` and inserted
+in fixed-size batches, so memory use does not depend on file size. A bad
+row is reported and skipped; it does not abort the rest of the import.
+
+Command line::
+
+    python importer.py catalog.csv --seller-id 1
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+import etags
+from database_models import Category, Product
+from models import ProductCreate
+
+
+DEFAULT_CHUNK_SIZE = 1000
+# only the first errors are kept so a badly broken file can't grow memory
+MAX_REPORTED_ERRORS = 100
+
+OPTIONAL_FIELDS = ("size", "color", "stock_status")
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    if fmt:
+        fmt = fmt.lower()
+    elif filename and filename.lower().endswith(".csv"):
+        fmt = "csv"
+    elif filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        fmt = "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError("Import format must be 'csv' or 'ndjson'")
+    return fmt
+
+
+def iter_records(lines: Iterable[str], fmt: str) -> Iterator[tuple]:
+    """Yield ``(row_number, record_or_exception)`` for each data row."""
+    if fmt == "csv":
+        for row_number, record in enumerate(csv.DictReader(lines), start=1):
+            yield row_number, record
+        return
+
+    row_number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield row_number, e
+            continue
+        yield row_number, record
+
+
+def load_category_map(db: Session) -> dict:
+    """Map both category ids and lower-cased names to ids."""
+    category_map = {}
+    for category_id, name in db.execute(select(Category.id, Category.name)):
+        category_map[category_id] = category_id
+        category_map[str(category_id)] = category_id
+        category_map[name.lower()] = category_id
+    return category_map
+
+
+def _resolve(record: dict, category_map: dict) -> dict:
+    record = {key: value for key, value in record.items() if key is not None}
+    for field in OPTIONAL_FIELDS:
+        if record.get(field) == "":
+            record.pop(field)
+
+    category = record.pop("category", None)
+    raw = record.get("category_id", category)
+    # NDJSON can carry any JSON value here; only names and ids can be looked up
+    if isinstance(raw, bool) or not isinstance(raw, (str, int)):
+        raise ValueError(f"Unknown category {raw!r}")
+    key = raw.strip().lower() if isinstance(raw, str) else raw
+    if key not in category_map:
+        raise ValueError(f"Unknown category {raw!r}")
+    record["category_id"] = category_map[key]
+    return record
+
+
+def import_products(
+    db: Session,
+    records: Iterable[tuple],
+    seller_id: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    category_map = load_category_map(db)
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        if not batch:
+            return
+        db.execute(insert(Product), batch)
+        # in the batch's own transaction, so committed rows are never hidden behind a stale ETag
+        etags.bump_version(db, "product")
+        db.commit()
+        inserted += len(batch)
+        batch.clear()
+
+    for row_number, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            product = ProductCreate.model_validate(_resolve(record, category_map))
+        except ValidationError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                errors.append({"row": row_number, "error": message})
+            continue
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": row_number, "error": str(e)})
+            continue
+
+        batch.append({"seller_id": seller_id, "is_deleted": False, **product.model_dump()})
+        if len(batch) >= chunk_size:
+            flush()
+    flush()
+
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+
+def import_file(db: Session, binary_file, filename: Optional[str], seller_id: int,
+                fmt: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    fmt = detect_format(filename, fmt)
+    lines = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        return import_products(db, iter_records(lines, fmt), seller_id, chunk_size)
+    finally:
+        lines.detach()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import products from CSV or NDJSON")
+    parser.add_argument("path", help="file to import, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--seller-id", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from database import session
+
+    db = session()
+    try:
+        if args.path == "-":
+            result = import_file(db, sys.stdin.buffer, None, args.seller_id, args.format, args.chunk_size)
+        else:
+            with open(args.path, "rb") as f:
+                result = import_file(db, f, args.path, args.seller_id, args.format, args.chunk_size)
+    finally:
+        db.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,42 @@
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, Response, UploadFile, status
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import models
-from database import engine, session, get_db
+import carts
+import catalog
+import search
+import etags
+import exporter
+import frontend
+import ratings
+import rollups
+import images
+import importer
+import metrics
+import profiler
+import ratelimit
+import slowlog
+import uploads
+import async_routes
+from cache import ALL_CACHES, category_cache, category_list_cache, principal_cache, product_cache, row_to_dict
+from database import session, get_db, get_async_db, pool_stats
 import database_models 
-from models import UserCreate, UserResponse, UserLogin, ProductCreate, CartResponse, CartCreate, TransactionCreate, TransactionResponse, ProductUpdate, CartBase, CartCreate, CategoryBase, CategoryResponse, CategoryCreate, HistoryBase, HistoryCreate, HistoryResponse, ReviewResponse, ReviewCreate,ProductImageCreate, ProductImageResponse
+from models import UserCreate, UserResponse, UserLogin, ProductCreate, CartResponse, CartCreate, TransactionCreate, TransactionResponse, ProductUpdate, CartBase, CartCreate, CategoryBase, CategoryResponse, CategoryCreate, HistoryBase, HistoryCreate, HistoryResponse, ReviewResponse, ReviewCreate,ProductImageCreate, ProductImageResponse, CheckoutRequest
+from models import CartDeleteResponse, CartViewResponse, CartWriteResponse, CategoryDeleteResponse, CategoryDetailResponse, CategoryListResponse, CheckoutResponse, ImportReportResponse, ProductDeleteResponse, ProductDetailResponse, ProductListResponse, ProductPageResponse, ProductSearchResponse, ProductWriteResponse, ReviewPageResponse
 from typing import Optional, List
 from datetime import datetime
-from sqlalchemy import LargeBinary
+from sqlalchemy import LargeBinary, select
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from auth import create_access_token, verify_password, get_current_user, verify_admin
+from auth import create_access_token, verify_password, get_current_user, verify_admin, hash_password_async, verify_and_update_async
 from database_models import Category, Product, Cart, User, Transaction, History, Review, ProductImage
 
-app = FastAPI()
+# routes declare a response_model, so responses are serialized by pydantic and
+# rendered by orjson instead of going through jsonable_encoder and json.dumps
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,10 +45,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+if profiler.PROFILE_REQUESTS:
+    # outermost, so a profile covers everything the request goes through
+    app.add_middleware(profiler.ProfilerMiddleware)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl = "/login/")
 
-database_models.Base.metadata.create_all(bind=engine)
+app.include_router(async_routes.router)
+
+# the built frontend (python frontend.py build); its pages call the API on this origin
+if frontend.is_built():
+    app.mount("/app", frontend.FrontendFiles(), name="frontend")
+
+# the schema is owned by the migrations (alembic upgrade head), not by workers
 
 @app.get("/user/", response_model=list[UserResponse])
 def get_all_users(db: Session = Depends(get_db)):
@@ -34,15 +66,17 @@ def get_all_users(db: Session = Depends(get_db)):
 
 
 @app.post("/user/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    new_user = database_models.User(**user.model_dump())
+async def create_user(user: UserCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
+    ratelimit.enforce(request, "signup")
+    user_data = user.model_dump()
+    user_data["password"] = await hash_password_async(user.password)
+    new_user = database_models.User(**user_data)
     try:
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
         return new_user
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -55,18 +89,23 @@ def get_user(id: int, db: Session = Depends(get_db)):
 
 
 @app.put("/user/{id}", response_model=UserResponse)
-def update_user(id: int, user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(database_models.User).filter(database_models.User.id == id).first()
+async def update_user(id: int, user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.get(database_models.User, id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+    old_username = db_user.username
+    # hashed on the bounded password pool, like create_user, not on the request threadpool
+    password = await hash_password_async(user.password)
     for key, value in user.model_dump().items():
         setattr(db_user, key, value)
+    db_user.password = password
     try:
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        principal_cache.invalidate(old_username)
+        principal_cache.invalidate(db_user.username)
         return db_user
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -78,6 +117,7 @@ def delete_user(id: int, db: Session = Depends(get_db)):
     try:
         db.delete(db_user)
         db.commit()
+        principal_cache.invalidate(db_user.username)
         return {"message": "User deleted successfully"}
     except SQLAlchemyError as e:
         db.rollback()
@@ -93,9 +133,13 @@ class TokenResponse(BaseModel):
     token_type: str = "Bearer"
 
 @app.post("/login/")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    
-    user = db.query(database_models.User).filter(database_models.User.email == form_data.username).first()
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # before the password check, so a throttled guess costs no bcrypt work
+    ratelimit.enforce(request, "login", user=form_data.username)
+
+    user = (await db.execute(
+        select(database_models.User).where(database_models.User.email == form_data.username)
+    )).scalars().first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,12 +147,18 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         )
 
     
-    if str(user.password) != form_data.password:  
+    valid, new_hash = await verify_and_update_async(form_data.password, str(user.password))
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
         )
 
+    # cost factor changed or legacy plaintext password: store a fresh hash
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
     
     token = create_access_token(data={"sub": user.username}, is_admin=user.is_admin)
     return {"access_token": token, "token_type": "bearer"}
@@ -122,6 +172,112 @@ def protected_route(current_user: database_models.User = Depends(get_current_use
     }
     
 
+@app.get("/cache/stats")
+def cache_stats(current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    return {"caches": [c.stats() for c in ALL_CACHES]}
+
+
+@app.get("/admin/sales/top-products")
+def sales_top_products(
+    by: str = "revenue",
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    try:
+        return {"status": "success", "data": rollups.top_products(db, by=by, limit=limit)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/sales/top-categories")
+def sales_top_categories(
+    by: str = "revenue",
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    try:
+        return {"status": "success", "data": rollups.top_categories(db, by=by, limit=limit)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/sales/daily")
+def sales_daily(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    return {"status": "success", "data": rollups.daily_series(db, days=days)}
+
+
+@app.get("/db/pool")
+def db_pool_stats(current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    return pool_stats()
+
+
+@app.get("/admin/slow-queries")
+def slow_queries(limit: int = Query(50, ge=1, le=1000), current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    data = slowlog.entries(limit)
+    return {
+        "status": "success",
+        "enabled": slowlog.enabled,
+        "threshold_ms": slowlog.SLOW_QUERY_MS,
+        "count": len(data),
+        "data": data,
+    }
+
+
+@app.delete("/admin/slow-queries")
+def clear_slow_queries(current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    slowlog.clear()
+    return {"status": "success", "message": "Slow query log cleared"}
+
+
+@app.get("/admin/profiles")
+def request_profiles(current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    data = profiler.profiles()
+    return {"status": "success", "enabled": profiler.PROFILE_REQUESTS, "count": len(data), "data": data}
+
+
+@app.get("/admin/profiles/background", response_class=PlainTextResponse)
+def background_profile(current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    if profiler.PROFILE_BACKGROUND_HZ <= 0:
+        raise HTTPException(status_code=404, detail="Background profiling is disabled")
+    return profiler.background_profile()
+
+
+@app.delete("/admin/profiles/background")
+def clear_background_profile(current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    profiler.clear_background()
+    return {"status": "success", "message": "Background profile cleared"}
+
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+def request_profile(profile_id: int, current_user: User = Depends(get_current_user)):
+    verify_admin(current_user)
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile["folded"]
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return metrics.metrics_response()
+
+
 @app.get("/")
 def welcome_message():
     return {"message": "Welcome to the E-commerce API"}
@@ -129,31 +285,61 @@ def welcome_message():
 
 
 
-@app.post("/category/", status_code=status.HTTP_201_CREATED)
+@app.post("/category/", response_model=CategoryDetailResponse, status_code=status.HTTP_201_CREATED)
 def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
     db_category = Category(name=category.name, description=category.description)
     db.add(db_category)
+    etags.bump_version(db, "category")
     db.commit()
     db.refresh(db_category)
+    category_list_cache.clear()
     return {"message": "Category created successfully", "category": db_category}
 
 
-@app.get("/category/", status_code=status.HTTP_200_OK)
-def get_all_categories(db: Session = Depends(get_db)):
-    categories = db.query(Category).all()
+@app.get("/category/", response_model=CategoryListResponse, status_code=status.HTTP_200_OK)
+def get_all_categories(request: Request, response: Response, db: Session = Depends(get_db)):
+    version = etags.get_version(db, "category")
+    not_modified = etags.check_not_modified(request, response, db, "category", version=version)
+    if not_modified:
+        return not_modified
+
+    # keyed by version: clear() only reaches this worker, so another worker's
+    # write must still miss here rather than pair its new ETag with a stale list
+    categories = category_list_cache.get_or_load(
+        version, lambda: [row_to_dict(category) for category in db.query(Category).all()]
+    )
     return {"message": "Categories fetched successfully", "categories": categories}
 
 
-@app.get("/category/{category_id}", status_code=status.HTTP_200_OK)
+@app.get("/category/{category_id}", response_model=CategoryDetailResponse, status_code=status.HTTP_200_OK)
 def get_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+    def load():
+        category = db.query(Category).filter(Category.id == category_id).first()
+        return row_to_dict(category) if category else None
+
+    category = category_cache.get_or_load(category_id, load)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return {"message": "Category fetched successfully", "category": category}
 
 
 
-@app.put("/category/{category_id}", status_code=status.HTTP_200_OK)
+@app.get("/category/{category_id}/top-rated", response_model=ProductListResponse, status_code=status.HTTP_200_OK)
+def get_top_rated_in_category(
+    category_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    min_reviews: int = Query(1, ge=0),
+    db: Session = Depends(get_db),
+):
+    products = ratings.top_rated(db, category_id, limit=limit, min_reviews=min_reviews)
+    return {
+        "status": "success",
+        "count": len(products),
+        "data": products
+    }
+
+
+@app.put("/category/{category_id}", response_model=CategoryDetailResponse, status_code=status.HTTP_200_OK)
 def update_category(category_id: int, updated_category: CategoryCreate, db: Session = Depends(get_db)):
     db_category = db.query(Category).filter(Category.id == category_id).first()
     if not db_category:
@@ -161,25 +347,36 @@ def update_category(category_id: int, updated_category: CategoryCreate, db: Sess
 
     db_category.name = updated_category.name
     db_category.description = updated_category.description
+    etags.bump_version(db, "category")
     db.commit()
     db.refresh(db_category)
+    category_cache.invalidate(category_id)
+    category_list_cache.clear()
     return {"message": "Category updated successfully", "category": db_category}
 
 
-@app.delete("/category/{category_id}", status_code=status.HTTP_200_OK)
+@app.delete("/category/{category_id}", response_model=CategoryDeleteResponse, status_code=status.HTTP_200_OK)
 def delete_category(category_id: int, db: Session = Depends(get_db)):
     db_category = db.query(Category).filter(Category.id == category_id).first()
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
 
+    detached = db.execute(select(Product.id).where(Product.category_id == category_id)).scalars().all()
+    # the delete detaches the category's products (category_id -> NULL), so product listings change too
     db.delete(db_category)
+    etags.bump_version(db, "category")
+    etags.bump_version(db, "product")
     db.commit()
+    category_cache.invalidate(category_id)
+    category_list_cache.clear()
+    for product_id in detached:
+        product_cache.invalidate(product_id)
     return {"message": "Category deleted successfully"}
 
 
 
 
-@app.post("/product/", status_code=status.HTTP_201_CREATED)
+@app.post("/product/", response_model=ProductWriteResponse, status_code=status.HTTP_201_CREATED)
 def add_product(product: ProductCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     verify_admin(current_user)
     
@@ -197,36 +394,102 @@ def add_product(product: ProductCreate, db: Session = Depends(get_db), current_u
         category_id=product.category_id
     )
     db.add(new_product)
+    etags.bump_version(db, "product")
     db.commit()
     db.refresh(new_product)
 
     return {
         "status": "success",
         "message": "Product created successfully",
-        "data": {
-            "id": new_product.id,
-            "name": new_product.name,
-            "description": new_product.description,
-            "price": new_product.price,
-            "quantity": new_product.quantity,
-            "category_id": new_product.category_id
-        }
+        "data": new_product
     }
 
 
-@app.get("/product/", status_code=status.HTTP_200_OK)
-def get_all_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
+@app.post("/product/import", response_model=ImportReportResponse, status_code=status.HTTP_200_OK)
+def bulk_import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    try:
+        result = importer.import_file(db, file.file, file.filename, current_user.id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "status": "success",
+        "message": f"Imported {result['inserted']} products",
+        **result
+    }
+
+
+@app.get("/product/", response_model=ProductPageResponse, status_code=status.HTTP_200_OK)
+def get_all_products(
+    request: Request,
+    response: Response,
+    category_id: Optional[List[int]] = Query(None),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    color: Optional[str] = None,
+    size: Optional[str] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    not_modified = etags.check_not_modified(request, response, db, "product", request.url.query)
+    if not_modified:
+        return not_modified
+
+    products, next_cursor = catalog.list_products(
+        db,
+        category_ids=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        color=color,
+        size=size,
+        sort=sort,
+        cursor=cursor,
+        limit=limit,
+    )
+    return {
+        "status": "success",
+        "count": len(products),
+        "next_cursor": next_cursor,
+        "data": products
+    }
+
+
+@app.get("/product/search", response_model=ProductSearchResponse, status_code=status.HTTP_200_OK)
+def search_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(search.DEFAULT_PAGE_SIZE, ge=1, le=search.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    products = search.search_products(db, q, limit=limit, offset=offset)
     return {
         "status": "success",
         "count": len(products),
+        "next_offset": offset + limit if len(products) == limit else None,
         "data": products
     }
 
 
-@app.get("/product/{product_id}", status_code=status.HTTP_200_OK)
+@app.get("/product/{product_id}", response_model=ProductDetailResponse, status_code=status.HTTP_200_OK)
 def get_product_by_id(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    def load():
+        product = db.query(Product).filter(Product.id == product_id).first()
+        return row_to_dict(product) if product else None
+
+    product = product_cache.get_or_load(product_id, load)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -236,7 +499,24 @@ def get_product_by_id(product_id: int, db: Session = Depends(get_db)):
     }
 
 
-@app.put("/product/{product_id}", status_code=status.HTTP_200_OK)
+@app.get("/product/{product_id}/reviews", response_model=ReviewPageResponse, status_code=status.HTTP_200_OK)
+def get_product_reviews(
+    product_id: int,
+    sort: str = "newest",
+    cursor: Optional[str] = None,
+    limit: int = Query(ratings.DEFAULT_REVIEW_PAGE_SIZE, ge=1, le=ratings.MAX_REVIEW_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    reviews, next_cursor = ratings.review_page(db, product_id, sort=sort, cursor=cursor, limit=limit)
+    return {
+        "status": "success",
+        "count": len(reviews),
+        "next_cursor": next_cursor,
+        "data": reviews
+    }
+
+
+@app.put("/product/{product_id}", response_model=ProductWriteResponse, status_code=status.HTTP_200_OK)
 def update_product(product_id: int, product: ProductUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     verify_admin(current_user)
     existing_product = db.query(Product).filter(Product.id == product_id).first()
@@ -247,8 +527,10 @@ def update_product(product_id: int, product: ProductUpdate, db: Session = Depend
     for key, value in update_data.items():
         setattr(existing_product, key, value)
 
+    etags.bump_version(db, "product")
     db.commit()
     db.refresh(existing_product)
+    product_cache.invalidate(product_id)
 
     return {
         "status": "success",
@@ -257,7 +539,7 @@ def update_product(product_id: int, product: ProductUpdate, db: Session = Depend
     }
 
 
-@app.delete("/product/{product_id}", status_code=status.HTTP_200_OK)
+@app.delete("/product/{product_id}", response_model=ProductDeleteResponse, status_code=status.HTTP_200_OK)
 def delete_product(product_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     verify_admin(current_user)
     product = db.query(Product).filter(Product.id == product_id).first()
@@ -265,7 +547,9 @@ def delete_product(product_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=404, detail="Product not found")
 
     db.delete(product)
+    etags.bump_version(db, "product")
     db.commit()
+    product_cache.invalidate(product_id)
 
     return {
         "status": "success",
@@ -281,12 +565,43 @@ def add_product_image(image: ProductImageCreate, db: Session = Depends(get_db)):
         image_url=image.image_url
     )
     db.add(new_image)
+    etags.bump_version(db, f"productimage:{image.product_id}")
     db.commit()
     db.refresh(new_image)
     return {"message": "✅ Image added successfully", "image_id": new_image.id}
 
 
 
+@app.post("/product/{product_id}/images", status_code=status.HTTP_201_CREATED)
+async def upload_product_image(
+    product_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    if not await db.get(Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    image_url, deduplicated = await uploads.receive_image(request)
+    image = (await db.execute(
+        select(ProductImage).where(ProductImage.product_id == product_id, ProductImage.image_url == image_url)
+    )).scalars().first()
+    if not image:
+        image = ProductImage(product_id=product_id, image_url=image_url)
+        db.add(image)
+        await db.run_sync(lambda sync_db: etags.bump_version(sync_db, f"productimage:{product_id}"))
+        await db.commit()
+
+    return {
+        "message": "✅ Image uploaded successfully",
+        "image_id": image.id,
+        "image_url": image_url,
+        "deduplicated": deduplicated
+    }
+
+
+
 @app.get("/productimage/", response_model=list[ProductImageResponse])
 def get_all_images(db: Session = Depends(get_db)):
     images = db.query(ProductImage).all()
@@ -295,7 +610,11 @@ def get_all_images(db: Session = Depends(get_db)):
 
 
 @app.get("/productimage/{product_id}", response_model=list[ProductImageResponse])
-def get_images_by_product(product_id: int, db: Session = Depends(get_db)):
+def get_images_by_product(product_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    not_modified = etags.check_not_modified(request, response, db, f"productimage:{product_id}")
+    if not_modified:
+        return not_modified
+
     images = db.query(ProductImage).filter(ProductImage.product_id == product_id).all()
     if not images:
         raise HTTPException(status_code=404, detail="No images found for this product")
@@ -303,6 +622,27 @@ def get_images_by_product(product_id: int, db: Session = Depends(get_db)):
 
 
 
+@app.get("/productimage/{image_id}/resize")
+def get_resized_image(
+    image_id: int,
+    request: Request,
+    w: int = Query(..., description="one of images.WIDTHS"),
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    fmt = images.negotiate_format(format, request.headers.get("accept", ""))
+    path, media_type, etag = images.get_variant(image.image_url, w, fmt)
+    headers = {"ETag": etag, "Cache-Control": images.VARIANT_CACHE_CONTROL, "Vary": "Accept"}
+    if etags.etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+
 @app.delete("/productimage{image_id}", response_model=dict)
 def delete_product_image(image_id: int, db: Session = Depends(get_db)):
     image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
@@ -310,13 +650,15 @@ def delete_product_image(image_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Image not found")
 
     db.delete(image)
+    etags.bump_version(db, f"productimage:{image.product_id}")
     db.commit()
     return {"message": "🗑️ Image deleted successfully"}
 
 
 
-@app.post("/cart/", status_code=status.HTTP_201_CREATED)
-def add_to_cart(cart_item: CartCreate, db: Session = Depends(get_db)):
+@app.post("/cart/", response_model=CartWriteResponse, status_code=status.HTTP_201_CREATED)
+def add_to_cart(cart_item: CartCreate, request: Request, db: Session = Depends(get_db)):
+    ratelimit.enforce(request, "cart", user=cart_item.buyer_id)
     # Check if user exists
     user = db.query(User).filter(User.id == cart_item.buyer_id).first()
     if not user:
@@ -337,58 +679,64 @@ def add_to_cart(cart_item: CartCreate, db: Session = Depends(get_db)):
         Cart.product_id == cart_item.product_id
     ).first()
 
-    if existing_item:
-        existing_item.quantity += cart_item.quantity
-        db.commit()
-        db.refresh(existing_item)
-        return {
-            "status": "success",
-            "message": "Cart updated successfully (quantity increased)",
-            "data": {
-                "id": existing_item.id,
-                "buyer_id": existing_item.buyer_id,
-                "product_id": existing_item.product_id,
-                "quantity": existing_item.quantity
+    if not existing_item:
+        new_cart = Cart(
+            buyer_id=cart_item.buyer_id,
+            product_id=cart_item.product_id,
+            quantity=cart_item.quantity
+        )
+        db.add(new_cart)
+        try:
+            db.commit()
+        except IntegrityError:
+            # uq_cart_buyer_id_product_id: a concurrent first add of this product won, so add onto its line
+            db.rollback()
+            existing_item = db.query(Cart).filter(
+                Cart.buyer_id == cart_item.buyer_id,
+                Cart.product_id == cart_item.product_id
+            ).first()
+            if not existing_item:
+                raise
+        else:
+            db.refresh(new_cart)
+            return {
+                "status": "success",
+                "message": "Product added to cart successfully",
+                "data": {
+                    "id": new_cart.id,
+                    "buyer_id": new_cart.buyer_id,
+                    "product_id": new_cart.product_id,
+                    "quantity": new_cart.quantity
+                }
             }
-        }
 
-    
-    new_cart = Cart(
-        buyer_id=cart_item.buyer_id,
-        product_id=cart_item.product_id,
-        quantity=cart_item.quantity
-    )
-    db.add(new_cart)
+    existing_item.quantity += cart_item.quantity
     db.commit()
-    db.refresh(new_cart)
-
+    db.refresh(existing_item)
     return {
         "status": "success",
-        "message": "Product added to cart successfully",
+        "message": "Cart updated successfully (quantity increased)",
         "data": {
-            "id": new_cart.id,
-            "buyer_id": new_cart.buyer_id,
-            "product_id": new_cart.product_id,
-            "quantity": new_cart.quantity
+            "id": existing_item.id,
+            "buyer_id": existing_item.buyer_id,
+            "product_id": existing_item.product_id,
+            "quantity": existing_item.quantity
         }
     }
 
 
-@app.get("/cart/{buyer_id}", status_code=status.HTTP_200_OK)
+@app.get("/cart/{buyer_id}", response_model=CartViewResponse, status_code=status.HTTP_200_OK)
 def get_user_cart(buyer_id: int, db: Session = Depends(get_db)):
-    cart_items = db.query(Cart).filter(Cart.buyer_id == buyer_id).all()
-    if not cart_items:
+    rows = db.execute(carts.cart_view_statement(buyer_id)).all()
+    if not rows:
         raise HTTPException(status_code=404, detail="Cart is empty")
 
-    return {
-        "status": "success",
-        "count": len(cart_items),
-        "data": cart_items
-    }
+    return carts.build_cart_view(rows)
 
 
-@app.put("/cart/{cart_id}", status_code=status.HTTP_200_OK)
-def update_cart(cart_id: int, cart_data: CartBase, db: Session = Depends(get_db)):
+@app.put("/cart/{cart_id}", response_model=CartWriteResponse, status_code=status.HTTP_200_OK)
+def update_cart(cart_id: int, cart_data: CartBase, request: Request, db: Session = Depends(get_db)):
+    ratelimit.enforce(request, "cart")
     cart_item = db.query(Cart).filter(Cart.id == cart_id).first()
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
@@ -412,8 +760,9 @@ def update_cart(cart_id: int, cart_data: CartBase, db: Session = Depends(get_db)
     }
 
 
-@app.delete("/cart/{cart_id}", status_code=status.HTTP_200_OK)
-def delete_cart_item(cart_id: int, db: Session = Depends(get_db)):
+@app.delete("/cart/{cart_id}", response_model=CartDeleteResponse, status_code=status.HTTP_200_OK)
+def delete_cart_item(cart_id: int, request: Request, db: Session = Depends(get_db)):
+    ratelimit.enforce(request, "cart")
     cart_item = db.query(Cart).filter(Cart.id == cart_id).first()
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
@@ -444,6 +793,7 @@ def create_transaction(transaction: TransactionCreate, db: Session = Depends(get
     )
 
     db.add(new_transaction)
+    rollups.record_order(db)
     db.commit()
     db.refresh(new_transaction)
 
@@ -456,6 +806,39 @@ def create_transaction(transaction: TransactionCreate, db: Session = Depends(get
 
 
 
+@app.post("/checkout/{buyer_id}", response_model=CheckoutResponse, status_code=status.HTTP_201_CREATED)
+def checkout(buyer_id: int, checkout_data: Optional[CheckoutRequest] = None, db: Session = Depends(get_db)):
+    payment_status = checkout_data.status if checkout_data else "Completed"
+    try:
+        order = carts.checkout_cart(db, buyer_id, payment_status)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for item in order["items"]:
+        product_cache.invalidate(item["product_id"])
+
+    return {
+        "status": "success",
+        "message": "Order placed successfully",
+        "data": order
+    }
+
+
+
+@app.get("/transaction/export")
+def export_transactions(
+    format: str = "ndjson",
+    buyer_id: Optional[int] = None,
+    status: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    statement = exporter.transaction_export_statement(buyer_id=buyer_id, status=status)
+    return exporter.export_response(statement, format, "transactions")
+
+
 @app.get("/transaction/", response_model=list[TransactionResponse])
 def get_all_transactions(db: Session = Depends(get_db)):
     transactions = db.query(Transaction).all()
@@ -487,6 +870,8 @@ def update_transaction(transaction_id: int, transaction_data: TransactionCreate,
             detail=f"Transaction with ID {transaction_id} not found."
         )
 
+    # the rollups count orders and the history lines' units/revenue, none of
+    # which depend on these fields, so there is nothing to adjust
     transaction.amount = transaction_data.amount
     transaction.status = transaction_data.status
     transaction.buyer_id = transaction_data.buyer_id
@@ -505,6 +890,14 @@ def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
             detail=f"Transaction with ID {transaction_id} not found."
         )
 
+    # history.transaction_id can't be NULL, and the order lines aren't deleted behind the caller's back
+    if db.query(History.id).filter(History.transaction_id == transaction_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Transaction with ID {transaction_id} still has history lines; delete them first."
+        )
+
+    rollups.record_order(db, orders=-1)
     db.delete(transaction)
     db.commit()
 
@@ -513,6 +906,19 @@ def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
 
 
 
+@app.get("/history/export")
+def export_history(
+    format: str = "ndjson",
+    buyer_id: Optional[int] = None,
+    status: Optional[str] = None,
+    transaction_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+):
+    verify_admin(current_user)
+    statement = exporter.history_export_statement(buyer_id=buyer_id, status=status, transaction_id=transaction_id)
+    return exporter.export_response(statement, format, "history")
+
+
 @app.get("/history/", response_model=list[models.HistoryResponse])
 def get_transaction_history(transaction_id: int, db: Session = Depends(get_db)):
     history = db.query(History).all()
@@ -544,6 +950,7 @@ def create_history(history_data: models.HistoryCreate, db: Session = Depends(get
     )
 
     db.add(new_history)
+    rollups.record_sales(db, [(product.id, product.category_id, new_history.quantity, product.price)])
     db.commit()
     db.refresh(new_history)
 
@@ -568,6 +975,7 @@ def delete_history(history_id: int, db: Session = Depends(get_db)):
             detail=f"History with ID {history_id} not found."
         )
 
+    rollups.reverse_sales(db, rollups.history_lines(db, History.id == history_id))
     db.delete(history)
     db.commit()
 
@@ -598,17 +1006,6 @@ def create_review(review: ReviewCreate, db: Session = Depends(get_db)):
             detail="❌ Product not found."
         )
 
-    # Check if buyer already reviewed this product
-    existing_review = db.query(Review).filter(
-        Review.buyer_id == review.buyer_id,
-        Review.product_id == review.product_id
-    ).first()
-    if existing_review:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="⚠️ You have already reviewed this product."
-        )
-
     new_review = Review(
         buyer_id=review.buyer_id,
         product_id=review.product_id,
@@ -616,9 +1013,21 @@ def create_review(review: ReviewCreate, db: Session = Depends(get_db)):
         comment=review.comment
     )
 
+    # uq_review_buyer_id_product_id rejects a second review by the same buyer
     db.add(new_review)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="⚠️ You have already reviewed this product."
+        )
+    ratings.apply_rating(db, review.product_id, 1, review.rating)
+    etags.bump_version(db, "product")
     db.commit()
     db.refresh(new_review)
+    product_cache.invalidate(review.product_id)
 
     return {
         "id": new_review.id,
@@ -660,34 +1069,32 @@ def update_review(review_id: int, updated_data: ReviewCreate, db: Session = Depe
             detail=f"❌ Review with ID {review_id} not found."
         )
 
-    '''review.rating = updated_data.rating
+    old_product_id, old_rating = review.product_id, review.rating
+
+    review.rating = updated_data.rating
     review.comment = updated_data.comment
     review.buyer_id = updated_data.buyer_id
     review.product_id = updated_data.product_id
 
-    db.commit()
-    db.refresh(review)
-
-    return review'''
-
-    updated_review = Review(
-        buyer_id=review.buyer_id,
-        product_id=review.product_id,
-        rating=review.rating,
-        comment=review.comment
-    )
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="⚠️ This buyer has already reviewed that product."
+        )
 
-    db.add(updated_review)
+    # move the review's contribution between products if it was re-pointed
+    ratings.apply_rating(db, old_product_id, -1, -old_rating)
+    ratings.apply_rating(db, review.product_id, 1, review.rating)
+    etags.bump_version(db, "product")
     db.commit()
-    db.refresh(updated_review)
+    db.refresh(review)
+    product_cache.invalidate(old_product_id)
+    product_cache.invalidate(review.product_id)
 
-    return {
-        "id": updated_review.id,
-        "buyer_id": updated_review.buyer_id,
-        "product_id": updated_review.product_id,
-        "rating": updated_review.rating,
-        "comment": updated_review.comment
-    }
+    return review
 
 
 @app.delete("/review/{review_id}")
@@ -700,6 +1107,9 @@ def delete_review(review_id: int, db: Session = Depends(get_db)):
         )
 
     db.delete(review)
+    ratings.apply_rating(db, review.product_id, -1, -review.rating)
+    etags.bump_version(db, "product")
     db.commit()
+    product_cache.invalidate(review.product_id)
 
     return {"message": f"✅ Review ID {review_id} deleted successfully."}
\ No newline at end of file
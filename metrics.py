@@ -0,0 +1,143 @@
+"""Request and SQL metrics in Prometheus format.
+
+:class:`MetricsMiddleware` times every request and labels it with the route
+template (``/cart/{buyer_id}``) rather than the raw path, so the number of
+series stays bounded. SQLAlchemy cursor events on both engines add to a
+per-request tally held in a context variable, which follows the request
+into Starlette's threadpool and into the async engine's greenlets.
+
+A round trip is one cursor execution; queries count each parameter set of an
+executemany separately, so a bulk insert is many queries in few round trips.
+
+With several worker processes set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory shared by the workers so /metrics reports all of them.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from starlette.responses import Response
+
+from database import async_engine, engine
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to serve a request", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("http_requests_total", "Requests served", ["method", "route", "status"])
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request", ["method", "route"], buckets=COUNT_BUCKETS
+)
+REQUEST_ROUND_TRIPS = Histogram(
+    "http_request_db_round_trips", "Database round trips per request", ["method", "route"], buckets=COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in the database per request", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "round_trips", "db_time")
+
+    def __init__(self, scope):
+        # routing fills in scope["route"], so it names the route once the endpoint runs
+        self.scope = scope
+        self.queries = 0
+        self.round_trips = 0
+        self.db_time = 0.0
+
+
+current_request: ContextVar = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    if stats is None:
+        return
+    started = conn.info["query_started"].pop()
+    stats.db_time += time.perf_counter() - started
+    stats.round_trips += 1
+    stats.queries += len(parameters) if executemany and parameters else 1
+
+
+def _handle_error(exception_context):
+    # the after event doesn't fire for a failed statement
+    connection = exception_context.connection
+    if current_request.get() is not None and connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument(target):
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+
+instrument(engine)
+instrument(async_engine.sync_engine)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # mounted apps (the frontend) are reported under their mount point
+    return scope.get("root_path") or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL work per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            method = scope["method"]
+            route = route_label(scope)
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_QUERIES.labels(method, route).observe(stats.queries)
+            REQUEST_ROUND_TRIPS.labels(method, route).observe(stats.round_trips)
+            REQUEST_DB_TIME.labels(method, route).observe(stats.db_time)
+
+
+def metrics_response() -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
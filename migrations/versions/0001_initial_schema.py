@@ -0,0 +1,223 @@
+"""Initial schema with the hot-path indexes
+
+Creates the full schema on an empty database. Databases previously built by
+``Base.metadata.create_all`` are brought up to date instead: missing tables,
+columns and indexes are added and existing ones are left alone. Duplicate
+cart lines and reviews are collapsed first so the unique indexes can be
+built.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database_models import PRODUCT_SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def rating_columns():
+    return [
+        sa.Column("rating_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rating_sum", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rating_avg", sa.Float(), nullable=False, server_default="0"),
+    ]
+
+
+TABLES = [
+    ("user", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False, unique=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("role", sa.String()),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("phone_number", sa.String(), nullable=False),
+        sa.Column("is_admin", sa.Boolean()),
+    ]),
+    ("category", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+        sa.Column("description", sa.String()),
+    ]),
+    ("product", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("seller_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String()),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("size", sa.String()),
+        sa.Column("color", sa.String()),
+        sa.Column("stock_status", sa.Boolean()),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("category.id")),
+        sa.Column("is_deleted", sa.Boolean()),
+        *rating_columns(),
+    ]),
+    ("productimage", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), nullable=False),
+        sa.Column("image_url", sa.String(), nullable=False),
+    ]),
+    ("cart", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("buyer_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), nullable=False),
+        sa.Column("quantity", sa.Integer()),
+    ]),
+    ("transaction", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("buyer_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+    ]),
+    ("history", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("buyer_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), nullable=False),
+        sa.Column("transaction_id", sa.Integer(), sa.ForeignKey("transaction.id"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+    ]),
+    ("review", lambda: [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("buyer_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), nullable=False),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("comment", sa.String(), nullable=False),
+    ]),
+    ("table_version", lambda: [
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    ]),
+    ("sales_product", lambda: [
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), primary_key=True),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+    ]),
+    ("sales_category", lambda: [
+        sa.Column("category_id", sa.Integer(), primary_key=True),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+    ]),
+    ("sales_daily", lambda: [
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+    ]),
+]
+
+
+# (name, table, columns, unique)
+INDEXES = [
+    ("ix_user_id", "user", ["id"], False),
+    ("ix_category_id", "category", ["id"], False),
+    ("ix_product_id", "product", ["id"], False),
+    ("ix_productimage_id", "productimage", ["id"], False),
+    ("ix_cart_id", "cart", ["id"], False),
+    ("ix_transaction_id", "transaction", ["id"], False),
+    ("ix_history_id", "history", ["id"], False),
+    ("ix_review_id", "review", ["id"], False),
+    # catalog listing, filters and top rated (catalog.py, ratings.py); the
+    # (category_id, id) index also serves plain category_id lookups
+    ("ix_product_category_id_id", "product", ["category_id", "id"], False),
+    ("ix_product_category_id_price_id", "product", ["category_id", "price", "id"], False),
+    ("ix_product_price_id", "product", ["price", "id"], False),
+    ("ix_product_category_id_rating_avg_id", "product", ["category_id", "rating_avg", "id"], False),
+    # hot-path foreign keys
+    ("ix_productimage_product_id", "productimage", ["product_id"], False),
+    ("uq_cart_buyer_id_product_id", "cart", ["buyer_id", "product_id"], True),
+    ("ix_transaction_buyer_id", "transaction", ["buyer_id"], False),
+    ("ix_history_buyer_id", "history", ["buyer_id"], False),
+    ("ix_history_transaction_id", "history", ["transaction_id"], False),
+    # review feed (ratings.review_page) and one review per buyer and product
+    ("uq_review_buyer_id_product_id", "review", ["buyer_id", "product_id"], True),
+    ("ix_review_product_id_id", "review", ["product_id", "id"], False),
+    ("ix_review_product_id_rating_id", "review", ["product_id", "rating", "id"], False),
+    ("ix_sales_product_revenue", "sales_product", ["revenue"], False),
+    ("ix_sales_product_units", "sales_product", ["units"], False),
+    ("ix_sales_category_revenue", "sales_category", ["revenue"], False),
+    ("ix_sales_category_units", "sales_category", ["units"], False),
+]
+
+MERGE_DUPLICATE_CART_LINES = [
+    "UPDATE cart SET quantity = (SELECT SUM(c.quantity) FROM cart c "
+    "WHERE c.buyer_id = cart.buyer_id AND c.product_id = cart.product_id) "
+    "WHERE id IN (SELECT MIN(id) FROM cart GROUP BY buyer_id, product_id HAVING COUNT(*) > 1)",
+    "DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY buyer_id, product_id)",
+]
+
+# keeps each buyer's latest review of a product
+DROP_DUPLICATE_REVIEWS = (
+    "DELETE FROM review WHERE id NOT IN (SELECT MAX(id) FROM review GROUP BY buyer_id, product_id)"
+)
+
+REBUILD_RATINGS = [
+    "UPDATE product SET "
+    "rating_count = (SELECT COUNT(*) FROM review WHERE review.product_id = product.id), "
+    "rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM review WHERE review.product_id = product.id)",
+    "UPDATE product SET rating_avg = CASE WHEN rating_count > 0 THEN rating_sum * 1.0 / rating_count ELSE 0 END",
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    for name, columns in TABLES:
+        if name not in existing_tables:
+            op.create_table(name, *columns())
+
+    rebuild_ratings = False
+    if "product" in existing_tables:
+        product_columns = {column["name"] for column in inspector.get_columns("product")}
+        for column in rating_columns():
+            if column.name not in product_columns:
+                op.add_column("product", column)
+                rebuild_ratings = True
+
+    existing_indexes = set()
+    for name in existing_tables:
+        existing_indexes.update(index["name"] for index in inspector.get_indexes(name))
+
+    for name, table, columns, unique in INDEXES:
+        if name in existing_indexes:
+            continue
+        if name == "uq_cart_buyer_id_product_id" and table in existing_tables:
+            for statement in MERGE_DUPLICATE_CART_LINES:
+                op.execute(statement)
+        if name == "uq_review_buyer_id_product_id" and table in existing_tables:
+            op.execute(DROP_DUPLICATE_REVIEWS)
+            rebuild_ratings = True
+        op.create_index(name, table, columns, unique=unique)
+
+    if rebuild_ratings:
+        for statement in REBUILD_RATINGS:
+            op.execute(statement)
+
+    # full-text search (search.py); every statement is IF NOT EXISTS
+    for statement in PRODUCT_SEARCH_DDL.get(bind.dialect.name, []):
+        op.execute(statement)
+    if bind.dialect.name == "sqlite":
+        op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS product_fts")
+    else:
+        op.execute("DROP INDEX IF EXISTS ix_product_search")
+    for name, _ in reversed(TABLES):
+        op.drop_table(name)
@@ -57,6 +57,17 @@ class CategoryResponse(CategoryBase):
         "from_attributes": True
     }
 
+class CategoryDetailResponse(BaseModel):
+    message: str
+    category: CategoryResponse
+
+class CategoryListResponse(BaseModel):
+    message: str
+    categories: list[CategoryResponse]
+
+class CategoryDeleteResponse(BaseModel):
+    message: str
+
 
 
 class ProductBase(BaseModel):
@@ -71,6 +82,59 @@ class ProductCreate(ProductBase):
     color: str | None = None
     stock_status: bool = True
 
+class ProductResponse(BaseModel):
+    id: int
+    seller_id: int
+    name: str
+    description: Optional[str] = None
+    price: float
+    quantity: int
+    size: Optional[str] = None
+    color: Optional[str] = None
+    stock_status: Optional[bool] = None
+    category_id: Optional[int] = None
+    is_deleted: Optional[bool] = None
+    rating_count: int = 0
+    rating_sum: int = 0
+    rating_avg: float = 0
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class ProductDetailResponse(BaseModel):
+    status: str = "success"
+    data: ProductResponse
+
+class ProductWriteResponse(ProductDetailResponse):
+    message: str
+
+class ProductListResponse(BaseModel):
+    status: str = "success"
+    count: int
+    data: list[ProductResponse]
+
+class ProductPageResponse(ProductListResponse):
+    next_cursor: Optional[str] = None
+
+class ProductSearchResponse(ProductListResponse):
+    next_offset: Optional[int] = None
+
+class ProductDeleteResponse(BaseModel):
+    status: str = "success"
+    message: str
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReportResponse(BaseModel):
+    status: str = "success"
+    message: str
+    inserted: int
+    failed: int
+    errors: list[ImportRowError]
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -114,6 +178,12 @@ class ReviewResponse(ReviewBase):
         "from_attributes": True
     }
 
+class ReviewPageResponse(BaseModel):
+    status: str = "success"
+    count: int
+    next_cursor: Optional[str] = None
+    data: list[ReviewResponse]
+
 
 
 class CartBase(BaseModel):
@@ -128,12 +198,35 @@ class CartResponse(CartBase):
     id: int
     buyer_id: int
     product_id: int
-    user_id: int
 
     model_config = {
         "from_attributes": True
     }
 
+class CartWriteResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: CartResponse
+
+class CartLineResponse(CartResponse):
+    name: str
+    price: float
+    stock: int
+    stock_status: Optional[bool] = None
+    image_url: Optional[str] = None
+    line_total: float
+
+class CartViewResponse(BaseModel):
+    status: str = "success"
+    count: int
+    item_count: int
+    total: float
+    data: list[CartLineResponse]
+
+class CartDeleteResponse(BaseModel):
+    status: str = "success"
+    message: str
+
 
 
 class TransactionBase(BaseModel):
@@ -153,6 +246,24 @@ class TransactionResponse(TransactionBase):
 
 
 
+class CheckoutRequest(BaseModel):
+    status: str = "Completed"
+
+class CheckoutItem(BaseModel):
+    product_id: int
+    quantity: int
+    price: float
+
+class CheckoutOrder(TransactionResponse):
+    items: list[CheckoutItem]
+
+class CheckoutResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: CheckoutOrder
+
+
+
 class HistoryBase(BaseModel):
     quantity: int
     status: str 
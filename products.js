@@ -1,7 +1,8 @@
-const API_BASE = 'http://localhost:8000'
+const API_BASE = ''
 let currentUser = null;
 let categories = [];
 let products = [];
+let nextCursor = null;
 
 // Check if we have a token before anything else
 function checkAuth() {
@@ -90,20 +91,31 @@ async function loadCategories() {
 
         // Add event listeners for filtering
         categoryFilters.querySelectorAll('input[type="checkbox"]').forEach(checkbox => {
-            checkbox.addEventListener('change', filterProducts);
+            checkbox.addEventListener('change', () => loadProducts());
         });
     } catch (err) {
         console.error('Error loading categories:', err);
     }
 }
 
-// Load and display products
-async function loadProducts() {
+// Build the /product/ query string from the active filters
+function productQuery(cursor) {
+    const params = new URLSearchParams();
+    document.querySelectorAll('#category-filters input:checked')
+        .forEach(input => params.append('category_id', input.value));
+    if (cursor) params.set('cursor', cursor);
+    return params.toString();
+}
+
+// Load and display products (filtered and paginated by the server)
+async function loadProducts(cursor = null) {
     try {
-        const res = await fetch(`${API_BASE}/product/`);
+        const res = await fetch(`${API_BASE}/product/?${productQuery(cursor)}`);
         if (!res.ok) throw new Error('Failed to load products');
         const data = await res.json();
-        products = data.data;
+        products = cursor ? products.concat(data.data) : data.data;
+        nextCursor = data.next_cursor;
+        document.getElementById('load-more').style.display = nextCursor ? 'block' : 'none';
         displayProducts(products);
     } catch (err) {
         console.error('Error loading products:', err);
@@ -167,20 +179,26 @@ function displayProducts(productsToShow) {
 // Search and filter functionality
 
 
-function filterProducts() {
-    const searchTerm = document.getElementById('search').value.toLowerCase();
-    const selectedCategories = Array.from(document.querySelectorAll('#category-filters input:checked'))
-        .map(input => parseInt(input.value));
+let searchTimer = null;
 
-    const filtered = products.filter(product => {
-        const matchesSearch = product.name.toLowerCase().includes(searchTerm) ||
-                            product.description.toLowerCase().includes(searchTerm);
-        const matchesCategory = selectedCategories.length === 0 || 
-                              selectedCategories.includes(product.category_id);
-        return matchesSearch && matchesCategory;
-    });
+async function searchProducts() {
+    const searchTerm = document.getElementById('search').value.trim();
+    if (!searchTerm) {
+        await loadProducts();
+        return;
+    }
 
-    displayProducts(filtered);
+    try {
+        const res = await fetch(`${API_BASE}/product/search?q=${encodeURIComponent(searchTerm)}`);
+        if (!res.ok) throw new Error('Failed to search products');
+        const data = await res.json();
+        products = data.data;
+        nextCursor = null;
+        document.getElementById('load-more').style.display = 'none';
+        displayProducts(products);
+    } catch (err) {
+        console.error('Error searching products:', err);
+    }
 }
 
 // modal
@@ -196,6 +214,15 @@ document.addEventListener("DOMContentLoaded", () => {
     const addProductBtn = document.getElementById('add-product');
     if (addProductBtn) addProductBtn.addEventListener('click', openModal);
 
+    const searchInput = document.getElementById('search');
+    if (searchInput) searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(searchProducts, 250);
+    });
+
+    const loadMoreBtn = document.getElementById('load-more');
+    if (loadMoreBtn) loadMoreBtn.addEventListener('click', () => loadProducts(nextCursor));
+
     const logoutBtn = document.getElementById('logout');
     if (logoutBtn) logoutBtn.addEventListener('click', () => {
         localStorage.removeItem('access_token');
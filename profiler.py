@@ -0,0 +1,242 @@
+"""Sampling profiler for single requests and a low-rate background sampler.
+
+Both sample the Python stacks of every thread with ``sys._current_frames``
+from a separate thread and count them as folded stacks (``a;b;c 12`` per
+line), the input format of flamegraph.pl, speedscope and inferno. Threads
+that are idle (the event loop waiting in select, threadpool workers waiting
+for work) are left out.
+
+Request profiling is enabled with ``PROFILE_REQUESTS``. An admin then adds
+``X-Profile: 1`` (or ``?profile=1``) to a request; from anyone else the
+flag is ignored and the request is served as usual. A profiled request is
+sampled every ``PROFILE_INTERVAL_MS`` from before the route's dependencies
+(authentication included) run until the response is sent, and the response
+carries ``X-Profile-Id`` for ``GET /admin/profiles/{profile_id}``. The
+sampler sees the whole process, so other requests running at the same time
+show up in the profile too: profile on a quiet worker.
+
+``PROFILE_BACKGROUND_HZ`` starts a sampler that runs for the life of the
+process and aggregates hot stacks across all requests, read at
+``GET /admin/profiles/background``.
+
+With both off no middleware is installed and no thread is started.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import count
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+from auth import get_current_user, verify_admin
+from database import session
+
+
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "20"))
+PROFILE_BACKGROUND_HZ = float(os.environ.get("PROFILE_BACKGROUND_HZ", "0"))
+# distinct stacks kept by the background sampler; rarer new stacks are dropped past this
+PROFILE_MAX_STACKS = int(os.environ.get("PROFILE_MAX_STACKS", "10000"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+APP_DIR = Path(__file__).resolve().parent
+# (file, function) of the innermost Python frame of a thread that is waiting for work
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_profiles = deque(maxlen=PROFILE_KEEP)
+_profiles_lock = threading.Lock()
+_ids = count(1)
+
+_background = Counter()
+_background_lock = threading.Lock()
+_background_sampler = None
+
+
+@lru_cache(maxsize=4096)
+def _location(filename: str) -> str:
+    path = Path(filename)
+    if path.is_relative_to(APP_DIR):
+        return path.relative_to(APP_DIR).as_posix()
+    parts = path.parts
+    if "site-packages" in parts:
+        return "/".join(parts[parts.index("site-packages") + 1:])
+    return path.name
+
+
+def _label(code) -> str:
+    return f"{code.co_qualname} ({_location(code.co_filename)})"
+
+
+def sample(counter: Counter, skip: int, limit: int = 0):
+    """Add the current stack of every busy thread except ``skip`` to ``counter``."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():
+        if ident == skip:
+            continue
+        code = frame.f_code
+        if (Path(code.co_filename).name, code.co_name) in IDLE_FRAMES:
+            continue
+        stack = []
+        while frame is not None:
+            stack.append(_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(names.get(ident, str(ident)))
+        folded = ";".join(reversed(stack))
+        if limit and folded not in counter and len(counter) >= limit:
+            continue
+        counter[folded] += 1
+
+
+def folded(counter: Counter) -> str:
+    return "".join(f"{stack} {samples}\n" for stack, samples in counter.most_common())
+
+
+class Sampler(threading.Thread):
+    """Samples every ``interval`` seconds into ``counter`` until stopped."""
+
+    def __init__(self, interval: float, counter: Counter, lock=None, limit: int = 0):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.counter = counter
+        self.lock = lock or threading.Lock()
+        self.limit = limit
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        ident = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            with self.lock:
+                sample(self.counter, ident, self.limit)
+            self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def start_background():
+    global _background_sampler
+    if _background_sampler is None:
+        _background_sampler = Sampler(1 / PROFILE_BACKGROUND_HZ, _background, _background_lock, PROFILE_MAX_STACKS)
+        _background_sampler.start()
+
+
+if PROFILE_BACKGROUND_HZ > 0:
+    start_background()
+
+
+def background_profile() -> str:
+    with _background_lock:
+        return folded(_background)
+
+
+def clear_background():
+    with _background_lock:
+        _background.clear()
+
+
+def profiles():
+    """Metadata of the stored request profiles, newest first."""
+    with _profiles_lock:
+        return [{key: value for key, value in profile.items() if key != "folded"} for profile in reversed(_profiles)]
+
+
+def get_profile(profile_id: int):
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile["id"] == profile_id:
+                return profile
+    return None
+
+
+def _requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value not in (b"", b"0", b"false")
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        return parse_qs(query.decode("latin-1")).get("profile", ["0"])[0] not in ("", "0", "false")
+    return False
+
+
+def _is_admin(scope) -> bool:
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                token = None
+    if not token:
+        return False
+    db = session()
+    try:
+        verify_admin(get_current_user(token, db))
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+    return True
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling the requests an admin asks for."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # the flag is ignored, not refused, for anyone but an admin
+        if scope["type"] != "http" or not _requested(scope) or not await run_in_threadpool(_is_admin, scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_ids)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, str(profile_id).encode())]
+            await send(message)
+
+        counter = Counter()
+        sampler = Sampler(PROFILE_INTERVAL_MS / 1000, counter)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            await run_in_threadpool(sampler.stop)
+            profile = {
+                "id": profile_id,
+                "at": datetime.now(timezone.utc).isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": metrics.route_label(scope),
+                "status": status_code,
+                "duration_ms": round(elapsed * 1000, 3),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": sampler.samples,
+                "folded": folded(counter),
+            }
+            with _profiles_lock:
+                _profiles.append(profile)
@@ -0,0 +1,184 @@
+"""Token bucket rate limiting shared by every worker process on the host.
+
+Each budget ("10/60": 10 requests, refilled evenly over 60 seconds) applies
+separately to the client IP and, where the route knows one, to the user; a
+request is let through only if both buckets have a token. Buckets live in a
+fixed-size table in a memory-mapped file (``RATE_LIMIT_FILE``, on /dev/shm by
+default) guarded by ``flock``, so all gunicorn workers see the same counts
+and a decision is a hash, a lock and a few struct reads: microseconds, with
+no network round trip.
+
+The table is open addressed over ``RATE_LIMIT_SLOTS`` slots of (key hash,
+tokens, updated). When the probed slots are all taken the least recently
+updated one is reused; a bucket idle long enough to have refilled loses
+nothing by that, so only a table far too small for the traffic weakens the
+limits. A refused request doesn't take a token, and the 429 response carries
+Retry-After: the seconds until the emptier bucket has one again.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+
+try:
+    import fcntl
+except ImportError:
+    # no flock (Windows): buckets are only shared between the threads of a process
+    fcntl = None
+
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_SLOTS = int(os.environ.get("RATE_LIMIT_SLOTS", "65536"))
+RATE_LIMIT_FILE = os.environ.get(
+    "RATE_LIMIT_FILE",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "eshop-ratelimit"),
+)
+
+# route -> default budget, overridden by RATE_LIMIT_<ROUTE> ("requests/seconds")
+DEFAULT_BUDGETS = {
+    "login": "10/60",
+    "signup": "5/60",
+    "cart": "60/60",
+}
+
+# consecutive slots tried for a key before the stalest one is reused
+PROBES = 8
+
+HEADER = struct.Struct("<4sII")
+MAGIC = b"ESRL"
+SLOT = struct.Struct("<Qdd")
+
+
+def parse_budget(value: str):
+    """``"10/60"`` -> ``(capacity, tokens per second)``."""
+    requests, _, seconds = value.partition("/")
+    capacity = float(requests)
+    period = float(seconds or 1)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f"Invalid rate limit budget {value!r}")
+    return capacity, capacity / period
+
+
+BUDGETS = {
+    route: parse_budget(os.environ.get(f"RATE_LIMIT_{route.upper()}", default))
+    for route, default in DEFAULT_BUDGETS.items()
+}
+
+
+def key_hash(key: str) -> int:
+    # stable across processes, unlike hash(); 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class BucketTable:
+    """The shared bucket table in ``path``."""
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = slots
+        self.size = HEADER.size + slots * SLOT.size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        # reopened after a fork: a flock taken through an inherited descriptor
+        # wouldn't exclude the parent
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != self.size:
+                os.ftruncate(fd, self.size)
+            table = mmap.mmap(fd, self.size)
+            if HEADER.unpack_from(table, 0) != (MAGIC, 1, self.slots):
+                # new file, or one laid out for a different slot count
+                table[:] = bytes(self.size)
+                HEADER.pack_into(table, 0, MAGIC, 1, self.slots)
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._map, self._pid = fd, table, os.getpid()
+
+    def _find(self, key: int, now: float) -> int:
+        start = key % self.slots
+        stalest, stalest_updated = None, math.inf
+        for probe in range(PROBES):
+            offset = HEADER.size + (start + probe) % self.slots * SLOT.size
+            slot_key, _, updated = SLOT.unpack_from(self._map, offset)
+            if slot_key == key:
+                return offset
+            if slot_key == 0:
+                stalest, stalest_updated = offset, -math.inf
+            elif updated < stalest_updated:
+                stalest, stalest_updated = offset, updated
+        return stalest
+
+    def take(self, keys, capacity: float, rate: float) -> float:
+        """Take a token from every bucket in ``keys``; return 0, or the seconds to wait.
+
+        Nothing is taken unless every bucket has a token.
+        """
+        now = time.time()
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                buckets = []
+                wait = 0.0
+                for key in keys:
+                    offset = self._find(key, now)
+                    slot_key, tokens, updated = SLOT.unpack_from(self._map, offset)
+                    if slot_key != key:
+                        tokens, updated = capacity, now
+                    # the clock can step back; never refill by a negative amount
+                    tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+                    if tokens < 1:
+                        wait = max(wait, (1 - tokens) / rate)
+                    buckets.append((offset, key, tokens))
+                if wait:
+                    return wait
+                for offset, key, tokens in buckets:
+                    SLOT.pack_into(self._map, offset, key, tokens - 1, now)
+                return 0.0
+            finally:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+table = BucketTable(RATE_LIMIT_FILE, RATE_LIMIT_SLOTS)
+
+
+def client_ip(request: Request) -> str:
+    # behind a proxy, run uvicorn/gunicorn with --forwarded-allow-ips so this is the real client
+    return request.client.host if request.client else "unknown"
+
+
+def enforce(request: Request, route: str, user: Optional[object] = None):
+    """Raise 429 if the client, or ``user``, is over the budget for ``route``."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    capacity, rate = BUDGETS[route]
+    keys = [key_hash(f"{route}|ip|{client_ip(request)}")]
+    if user is not None:
+        keys.append(key_hash(f"{route}|user|{user}"))
+    wait = table.take(keys, capacity, rate)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, try again later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
@@ -0,0 +1,117 @@
+"""Rating aggregates stored on the product row.
+
+``Product.rating_count``/``rating_sum``/``rating_avg`` are adjusted in the
+same transaction as every review write, so showing a product's rating or
+ranking a category never aggregates the review table.
+
+``review_page`` serves a product's review feed with keyset pagination over
+``ix_review_product_id_id`` / ``ix_review_product_id_rating_id``.
+
+Command line (recompute every product from the review table)::
+
+    python ratings.py rebuild
+"""
+import sys
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from catalog import decode_cursor, pack_cursor
+from database_models import Product, Review
+
+
+DEFAULT_REVIEW_PAGE_SIZE = 20
+MAX_REVIEW_PAGE_SIZE = 100
+REVIEW_SORTS = ("newest", "rating")
+
+
+def apply_rating(db: Session, product_id: int, count_delta: int, sum_delta: int):
+    """Adjust a product's aggregates by the given deltas with one atomic UPDATE.
+
+    The new values are computed from the row's current ones inside the
+    statement, so concurrent review writes can't lose each other's updates.
+    """
+    new_count = Product.rating_count + count_delta
+    new_sum = Product.rating_sum + sum_delta
+    db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=case((new_count > 0, new_sum * 1.0 / new_count), else_=0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def top_rated(db: Session, category_id: int, limit: int = 10, min_reviews: int = 1):
+    # walks ix_product_category_id_rating_avg_id backwards
+    return db.execute(
+        select(Product)
+        .where(Product.category_id == category_id, Product.rating_count >= min_reviews)
+        .order_by(Product.rating_avg.desc(), Product.id.desc())
+        .limit(limit)
+    ).scalars().all()
+
+
+def review_page(db: Session, product_id: int, sort: str = "newest",
+                cursor: Optional[str] = None, limit: int = DEFAULT_REVIEW_PAGE_SIZE):
+    """Return one page of a product's reviews and the cursor for the next page.
+
+    ``newest`` orders by id, ``rating`` by ``(rating, id)``, both descending.
+    """
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown sort key '{sort}'")
+
+    query = select(Review).where(Review.product_id == product_id)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == "newest":
+            query = query.where(Review.id < last_id)
+        else:
+            query = query.where(tuple_(Review.rating, Review.id) < tuple_(value, last_id))
+
+    if sort == "newest":
+        query = query.order_by(Review.id.desc())
+    else:
+        query = query.order_by(Review.rating.desc(), Review.id.desc())
+
+    rows = db.execute(query.limit(limit + 1)).scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = pack_cursor(sort, last.rating if sort == "rating" else last.id, last.id)
+    return rows, next_cursor
+
+
+def rebuild(db: Session):
+    """Recompute every product's aggregates from the review table."""
+    count = select(func.count(Review.id)).where(Review.product_id == Product.id).scalar_subquery()
+    total = select(func.coalesce(func.sum(Review.rating), 0)).where(Review.product_id == Product.id).scalar_subquery()
+    db.execute(
+        update(Product)
+        .values(
+            rating_count=count,
+            rating_sum=total,
+            rating_avg=case((count > 0, total * 1.0 / count), else_=0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python ratings.py rebuild")
+
+    from database import session
+
+    db = session()
+    try:
+        rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,197 @@
+"""Sales rollups for the admin analytics endpoints.
+
+``record_sales`` and ``record_order`` are called in the same transaction as
+the history/transaction writes they summarize, so the rollup tables stay
+current and reports read a handful of rows instead of scanning history.
+
+Deleting history or transaction rows reverses their contribution through
+``reverse_sales`` and ``record_order(orders=-1)``. The rows carry no
+timestamp, so a reversal is booked on the day it is made; totals over any
+span that includes both days stay exact. Lines are valued at the product's
+current price, as when they were recorded, so a price change in between
+leaves the difference in revenue.
+
+For the same reason ``rebuild`` can only backfill the per-product and
+per-category totals (valued at current prices); the daily series covers
+sales recorded after rollups were enabled.
+
+Command line::
+
+    python rollups.py rebuild
+"""
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database_models import Category, CategorySales, DailySales, History, Product, ProductSales
+
+
+UNCATEGORIZED = 0
+
+UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def today() -> date:
+    return datetime.utcnow().date()
+
+
+def _increment(db: Session, model, key: str, rows: list):
+    """Add each row's values onto the existing rollup row, creating it if needed."""
+    if not rows:
+        return
+    columns = [column for column in rows[0] if column != key]
+    dialect_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={column: getattr(model, column) + statement.excluded[column] for column in columns},
+        )
+        db.execute(statement, rows)
+        return
+
+    for row in rows:
+        updated = db.execute(
+            update(model)
+            .where(getattr(model, key) == row[key])
+            .values({column: getattr(model, column) + row[column] for column in columns})
+        ).rowcount
+        if not updated:
+            db.execute(insert(model).values(**row))
+
+
+def record_sales(db: Session, lines: Iterable[tuple], day: Optional[date] = None):
+    """Fold sold lines of ``(product_id, category_id, quantity, price)`` into the rollups.
+
+    Lines are aggregated first, so each rollup table costs one statement
+    regardless of how many lines an order has.
+    """
+    by_product = defaultdict(lambda: [0, 0.0])
+    by_category = defaultdict(lambda: [0, 0.0])
+    units = 0
+    revenue = 0.0
+    for product_id, category_id, quantity, price in lines:
+        line_revenue = quantity * price
+        for totals in (by_product[product_id], by_category[category_id or UNCATEGORIZED]):
+            totals[0] += quantity
+            totals[1] += line_revenue
+        units += quantity
+        revenue += line_revenue
+
+    if not by_product:
+        return
+
+    _increment(db, ProductSales, "product_id", [
+        {"product_id": key, "units": totals[0], "revenue": totals[1]} for key, totals in by_product.items()
+    ])
+    _increment(db, CategorySales, "category_id", [
+        {"category_id": key, "units": totals[0], "revenue": totals[1]} for key, totals in by_category.items()
+    ])
+    _increment(db, DailySales, "day", [
+        {"day": day or today(), "orders": 0, "units": units, "revenue": revenue}
+    ])
+
+
+def reverse_sales(db: Session, lines: Iterable[tuple], day: Optional[date] = None):
+    """Take lines of ``(product_id, category_id, quantity, price)`` back out of the rollups."""
+    record_sales(db, [(product_id, category_id, -quantity, price) for product_id, category_id, quantity, price in lines], day)
+
+
+def record_order(db: Session, day: Optional[date] = None, orders: int = 1):
+    _increment(db, DailySales, "day", [{"day": day or today(), "orders": orders, "units": 0, "revenue": 0.0}])
+
+
+def history_lines(db: Session, *criteria):
+    """``(product_id, category_id, quantity, price)`` of the history rows matching ``criteria``."""
+    return db.execute(
+        select(History.product_id, Product.category_id, History.quantity, Product.price)
+        .join(Product, Product.id == History.product_id)
+        .where(*criteria)
+    ).all()
+
+
+def _ranking_column(model, by: str):
+    if by not in ("revenue", "units"):
+        raise ValueError("Rank by 'revenue' or 'units'")
+    return getattr(model, by)
+
+
+def top_products(db: Session, by: str = "revenue", limit: int = 10):
+    column = _ranking_column(ProductSales, by)
+    rows = db.execute(
+        select(ProductSales.product_id, Product.name, ProductSales.units, ProductSales.revenue)
+        .join(Product, Product.id == ProductSales.product_id)
+        .order_by(column.desc())
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+def top_categories(db: Session, by: str = "revenue", limit: int = 10):
+    column = _ranking_column(CategorySales, by)
+    rows = db.execute(
+        select(CategorySales.category_id, Category.name, CategorySales.units, CategorySales.revenue)
+        .outerjoin(Category, Category.id == CategorySales.category_id)
+        .order_by(column.desc())
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+def daily_series(db: Session, days: int = 30):
+    since = today() - timedelta(days=days - 1)
+    rows = db.execute(
+        select(DailySales.day, DailySales.orders, DailySales.units, DailySales.revenue)
+        .where(DailySales.day >= since)
+        .order_by(DailySales.day)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+def rebuild(db: Session):
+    """Recompute the product and category rollups from the history table."""
+    line_revenue = History.quantity * Product.price
+    category_key = func.coalesce(Product.category_id, UNCATEGORIZED)
+
+    db.execute(delete(ProductSales))
+    db.execute(delete(CategorySales))
+    db.execute(
+        insert(ProductSales).from_select(
+            ["product_id", "units", "revenue"],
+            select(History.product_id, func.sum(History.quantity), func.sum(line_revenue))
+            .join(Product, Product.id == History.product_id)
+            .group_by(History.product_id),
+        )
+    )
+    db.execute(
+        insert(CategorySales).from_select(
+            ["category_id", "units", "revenue"],
+            select(category_key, func.sum(History.quantity), func.sum(line_revenue))
+            .select_from(History)
+            .join(Product, Product.id == History.product_id)
+            .group_by(category_key),
+        )
+    )
+    db.commit()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python rollups.py rebuild")
+
+    from database import session
+
+    db = session()
+    try:
+        rebuild(db)
+    finally:
+        db.close()
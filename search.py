@@ -0,0 +1,93 @@
+import re
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from database_models import PRODUCT_SEARCH_DDL, Product
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# must match the expression of ix_product_search so PostgreSQL uses the index
+PG_SEARCH_VECTOR = "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, ''))"
+
+PG_SEARCH_SQL = text(f"""
+    SELECT id, ts_rank({PG_SEARCH_VECTOR}, query) AS rank
+    FROM product, websearch_to_tsquery('english', :q) AS query
+    WHERE {PG_SEARCH_VECTOR} @@ query
+    ORDER BY rank DESC, id
+    LIMIT :limit OFFSET :offset
+""")
+
+SQLITE_SEARCH_SQL = text("""
+    SELECT rowid AS id FROM product_fts
+    WHERE product_fts MATCH :q
+    ORDER BY rank, rowid
+    LIMIT :limit OFFSET :offset
+""")
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def fts5_query(q: str) -> str:
+    # Quote every term so user input can't inject FTS5 syntax; the last term is
+    # a prefix match so results show up while the user is still typing.
+    terms = _TERM.findall(q)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _ranked_ids(db: Session, q: str, limit: int, offset: int):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return [row.id for row in db.execute(PG_SEARCH_SQL, {"q": q, "limit": limit, "offset": offset})]
+    if dialect == "sqlite":
+        match = fts5_query(q)
+        if not match:
+            return []
+        return [row.id for row in db.execute(SQLITE_SEARCH_SQL, {"q": match, "limit": limit, "offset": offset})]
+
+    # no text index on this backend; unranked substring match
+    pattern = f"%{q}%"
+    rows = (
+        db.query(Product.id)
+        .filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+        .order_by(Product.id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return [row.id for row in rows]
+
+
+def search_products(db: Session, q: str, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
+    """Return a page of products matching ``q``, best match first."""
+    ids = _ranked_ids(db, q, limit, offset)
+    if not ids:
+        return []
+    by_id = {product.id: product for product in db.query(Product).filter(Product.id.in_(ids))}
+    return [by_id[product_id] for product_id in ids if product_id in by_id]
+
+
+def rebuild_search_index(db: Session):
+    """Create the search index if missing and re-sync it with the product table."""
+    dialect = db.get_bind().dialect.name
+    for statement in PRODUCT_SEARCH_DDL.get(dialect, []):
+        db.execute(text(statement))
+    if dialect == "sqlite":
+        db.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+    db.commit()
+
+
+if __name__ == "__main__":
+    from database import session
+
+    db = session()
+    try:
+        rebuild_search_index(db)
+    finally:
+        db.close()
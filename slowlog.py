@@ -0,0 +1,191 @@
+"""Slow query log.
+
+Off unless ``SLOW_QUERY_MS`` is set. When it is, cursor events on both
+engines time every statement; one over the threshold is recorded with its
+normalized SQL, the shape of its parameters (types, never values), its
+duration and the route that ran it. The log is a ring buffer of the last
+``SLOW_QUERY_LOG_SIZE`` entries per worker process, read by admins at
+``GET /admin/slow-queries``.
+
+A statement's plan is captured with EXPLAIN on the same connection, so it
+sees the same transaction, at most once per normalized statement every
+``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds. ``SLOW_QUERY_EXPLAIN_ANALYZE``
+switches PostgreSQL to EXPLAIN ANALYZE for SELECTs; that runs the query a
+second time, so leave it off unless the plain plan isn't enough. On
+PostgreSQL the EXPLAIN runs inside a savepoint that is always rolled back,
+so a failing EXPLAIN can't abort the request's transaction.
+
+When nothing is slow the cost is a clock read per statement; when the log is
+off the events aren't registered at all.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import count
+
+from sqlalchemy import event
+
+import metrics
+from database import async_engine, engine
+
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS") or 0)
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get("SLOW_QUERY_EXPLAIN_ANALYZE", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+
+enabled = SLOW_QUERY_MS > 0
+
+EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+# statements already explained, forgotten wholesale when it grows past this
+MAX_EXPLAINED = 1000
+
+_entries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_entries_lock = threading.Lock()
+_ids = count(1)
+_explained = {}
+
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s|%s|\$\d+|:\w+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse literals, IN lists and whitespace so repeats of a query read the same."""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?, ...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _types(parameters):
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def parameter_shape(parameters, executemany: bool):
+    if executemany:
+        return {"executemany": len(parameters), "each": _types(parameters[0]) if parameters else None}
+    return _types(parameters)
+
+
+def _explain_prefix(dialect: str, statement: str):
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    if verb not in EXPLAINABLE:
+        return None
+    if dialect == "sqlite":
+        return "EXPLAIN QUERY PLAN "
+    if dialect == "postgresql":
+        # ANALYZE executes the statement again; only do that for reads
+        return "EXPLAIN ANALYZE " if SLOW_QUERY_EXPLAIN_ANALYZE and verb in ("select", "with") else "EXPLAIN "
+    return None
+
+
+def _should_explain(normalized: str) -> bool:
+    now = time.monotonic()
+    with _entries_lock:
+        last = _explained.get(normalized)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        if len(_explained) >= MAX_EXPLAINED:
+            _explained.clear()
+        _explained[normalized] = now
+        return True
+
+
+def explain(conn, statement, parameters, executemany):
+    """Return the plan of ``statement`` as lines of text, or None if it can't be explained."""
+    dialect = conn.dialect.name
+    prefix = _explain_prefix(dialect, statement)
+    if prefix is None:
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+
+    # a raw DBAPI cursor, so neither this log nor the metrics see the EXPLAIN
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if dialect == "postgresql":
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return [row[0] for row in rows]
+        cursor.execute(prefix + statement, parameters)
+        # EXPLAIN QUERY PLAN rows are (id, parent, notused, detail)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def record(conn, statement, parameters, executemany, seconds: float):
+    normalized = normalize_sql(statement)
+    stats = metrics.current_request.get()
+    entry = {
+        "id": next(_ids),
+        "at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(seconds * 1000, 3),
+        "method": stats.scope["method"] if stats is not None else None,
+        "route": metrics.route_label(stats.scope) if stats is not None else None,
+        "statement": normalized,
+        "parameters": parameter_shape(parameters, executemany),
+        "plan": None,
+    }
+    if SLOW_QUERY_EXPLAIN and _should_explain(normalized):
+        try:
+            entry["plan"] = explain(conn, statement, parameters, executemany)
+        except Exception as e:
+            entry["plan_error"] = f"{type(e).__name__}: {e}"
+    with _entries_lock:
+        _entries.append(entry)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["slow_query_started"].pop()
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        record(conn, statement, parameters, executemany, seconds)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_started"):
+        connection.info["slow_query_started"].pop()
+
+
+def instrument(target):
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+
+if enabled:
+    instrument(engine)
+    instrument(async_engine.sync_engine)
+
+
+def entries(limit: int = 50):
+    """The most recent slow statements, newest first."""
+    with _entries_lock:
+        return list(reversed(_entries))[:limit]
+
+
+def clear():
+    with _entries_lock:
+        _entries.clear()
+        _explained.clear()
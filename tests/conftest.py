@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# set before the app modules are imported: database.py reads DATABASE_URL at import
+TMP_DIR = tempfile.mkdtemp(prefix="eshop-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/test.db"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    import database
+    import main
+    from cache import ALL_CACHES
+    from database_models import Base
+
+    Base.metadata.drop_all(database.engine)
+    Base.metadata.create_all(database.engine)
+    for cache in ALL_CACHES:
+        cache.clear()
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(client):
+    import database
+
+    db = database.session()
+    yield db
+    db.close()
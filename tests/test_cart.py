@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+import database
+from database_models import Cart, Category, Product, User
+
+
+def seed_catalog(db):
+    db.add(User(username="buyer", email="buyer@example.com", password="x", address="x", phone_number="1"))
+    db.add(Category(name="Lamps"))
+    db.commit()
+    db.add(Product(seller_id=1, name="Lamp", description="d", price=2.0, quantity=10, category_id=1))
+    db.commit()
+
+
+@pytest.mark.parametrize("path", ["/cart/", "/async/cart/"])
+def test_concurrent_first_add_increments_the_winning_line(client, db, path):
+    seed_catalog(db)
+
+    raced = []
+
+    def competing_add(session, flush_context, instances):
+        # another request adds the same product after this one found no line, before it inserts its own
+        if not raced and any(isinstance(obj, Cart) for obj in session.new):
+            raced.append(True)
+            with database.engine.begin() as conn:
+                conn.execute(insert(Cart).values(buyer_id=1, product_id=1, quantity=2))
+
+    event.listen(Session, "before_flush", competing_add)
+    try:
+        response = client.post(path, json={"buyer_id": 1, "product_id": 1, "quantity": 3})
+    finally:
+        event.remove(Session, "before_flush", competing_add)
+
+    assert response.status_code == 201
+    assert response.json()["message"] == "Cart updated successfully (quantity increased)"
+    assert [(line.product_id, line.quantity) for line in db.query(Cart).all()] == [(1, 5)]
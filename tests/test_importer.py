@@ -0,0 +1,43 @@
+import io
+import json
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+import importer
+from database_models import Base, Category, Product, User
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(username="admin", email="admin@example.com", password="x", address="x", phone_number="1", is_admin=True))
+    db.add(Category(name="Lamps"))
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
+
+
+def ndjson(*rows):
+    return io.BytesIO("".join(json.dumps(row) + "\n" for row in rows).encode())
+
+
+def test_unhashable_category_is_a_row_error(db):
+    product = {"name": "Lamp", "description": "d", "price": 9.5, "quantity": 3}
+    rows = ndjson(
+        {**product, "category_id": 1},
+        {**product, "category_id": [1]},
+        {**product, "category_id": {"id": 1}},
+        {**product, "category": "lamps"},
+    )
+
+    result = importer.import_file(db, rows, "products.ndjson", seller_id=1)
+
+    assert result["inserted"] == 2
+    assert result["failed"] == 2
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+    assert db.execute(select(func.count()).select_from(Product)).scalar() == 2
@@ -0,0 +1,33 @@
+from database_models import Category, DailySales, History, Product, Transaction, User
+
+
+def seed_catalog(db):
+    db.add(User(username="buyer", email="buyer@example.com", password="x", address="x", phone_number="1"))
+    db.add(Category(name="Lamps"))
+    db.commit()
+    db.add(Product(seller_id=1, name="Lamp", description="d", price=2.0, quantity=10, category_id=1))
+    db.commit()
+
+
+def test_delete_transaction_with_history_is_refused(client, db):
+    seed_catalog(db)
+    client.post("/cart/", json={"buyer_id": 1, "product_id": 1, "quantity": 2})
+    order = client.post("/checkout/1").json()["data"]
+
+    response = client.delete(f"/transaction/{order['id']}")
+
+    assert response.status_code == 409
+    assert db.get(Transaction, order["id"]) is not None
+    assert db.query(History).filter(History.transaction_id == order["id"]).count() == 1
+    assert db.query(DailySales.orders).scalar() == 1
+
+
+def test_delete_transaction_without_history_reverses_the_order(client, db):
+    seed_catalog(db)
+    transaction = client.post("/transaction/", json={"buyer_id": 1, "amount": 5.0, "status": "Completed"}).json()
+
+    response = client.delete(f"/transaction/{transaction['id']}")
+
+    assert response.status_code == 200
+    assert db.get(Transaction, transaction["id"]) is None
+    assert db.query(DailySales.orders).scalar() == 0
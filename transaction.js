@@ -8,7 +8,7 @@ const simulateBtn = document.getElementById("simulate-payment");
 // Fetch transactions
 async function loadTransactions() {
   try {
-    const response = await fetch("http://127.0.0.1:8000/transaction/", {
+    const response = await fetch("/transaction/", {
       headers: { Authorization: `Bearer ${token}` },
     });
     const transactions = await response.json();
@@ -63,7 +63,7 @@ simulateBtn.addEventListener("click", async () => {
       payment_method: "Online",
     };
 
-    const res = await fetch("http://127.0.0.1:8000/transaction/", {
+    const res = await fetch("/transaction/", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
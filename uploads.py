@@ -0,0 +1,168 @@
+"""Streaming product image uploads.
+
+The multipart body is parsed as it arrives and the file part is written
+straight into a temporary file under ``UPLOAD_DIR`` while being hashed, so
+an upload never holds more than one network chunk in memory and the file is
+written to disk once. The finished file is renamed to its SHA-256, which
+makes identical images uploaded for different products share one file.
+"""
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from images import MEDIA_ROOT
+
+
+# inside MEDIA_ROOT so uploaded images can be resized like any other (images.py)
+UPLOAD_DIR = MEDIA_ROOT / "uploads"
+MAX_IMAGE_UPLOAD_BYTES = int(os.environ.get("MAX_IMAGE_UPLOAD_BYTES", 20 * 1024 * 1024))
+
+# the multipart field the image is sent in
+FILE_FIELD = b"file"
+
+# leading bytes -> extension; the client's filename and content type are not trusted
+SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+def sniff_extension(head: bytes) -> str:
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Upload a JPEG, PNG, GIF or WebP image")
+
+
+def _verify(path: str):
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unreadable image")
+
+
+class _FilePart:
+    """multipart parser callbacks that collect the data of the file field."""
+
+    def __init__(self):
+        self.headers = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.in_file = False
+        self.found = False
+        self.pending = []
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data, start, end):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        # only the first file field is kept
+        self.in_file = options.get(b"name") == FILE_FIELD and not self.found
+
+    def on_part_data(self, data, start, end):
+        if self.in_file:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        if self.in_file:
+            self.found = True
+            self.in_file = False
+
+
+async def receive_image(request: Request):
+    """Stream the request's image to disk; return its path relative to MEDIA_ROOT.
+
+    Returns ``(image_url, deduplicated)`` where ``deduplicated`` is true when
+    an identical image was already stored.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a multipart/form-data body")
+
+    part = _FilePart()
+    parser = MultipartParser(boundary, part.callbacks())
+    digest = hashlib.sha256()
+    head = b""
+    extension = None
+    size = 0
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    f = os.fdopen(fd, "wb")
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body")
+            if not part.pending:
+                continue
+
+            data = b"".join(part.pending)
+            part.pending.clear()
+            size += len(data)
+            if size > MAX_IMAGE_UPLOAD_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+            if extension is None:
+                head += data[:16]
+                if len(head) >= 12:
+                    extension = sniff_extension(head)
+            digest.update(data)
+            await run_in_threadpool(f.write, data)
+        parser.finalize()
+
+        if not part.found or size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No image in the 'file' field")
+        if extension is None:
+            extension = sniff_extension(head)
+        f.close()
+        await run_in_threadpool(_verify, tmp)
+
+        target = UPLOAD_DIR / f"{digest.hexdigest()}{extension}"
+        deduplicated = target.exists()
+        if deduplicated:
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, target)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    return target.relative_to(MEDIA_ROOT).as_posix(), deduplicated